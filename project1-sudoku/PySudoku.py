@@ -1,58 +1,101 @@
 import sys, os, random, pygame
-sys.path.append(os.path.join("objects"))
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, "objects"))
 import SudokuSquare
 from GameResources import *
 
 digits = '123456789'
 rows = 'ABCDEFGHI'
 
+size = width, height = 700, 700
+
+# most frames render() keeps for a GIF, which is built in memory
+MAX_GIF_FRAMES = 100
+
+
+def square_position(x, y):
+    """Top left corner of the square in column x, row y, in pixels."""
+    if x in (0, 1, 2):  startX = (x * 57) + 38
+    if x in (3, 4, 5):  startX = (x * 57) + 99
+    if x in (6, 7, 8):  startX = (x * 57) + 159
+
+    if y in (0, 1, 2):  startY = (y * 57) + 35
+    if y in (3, 4, 5):  startY = (y * 57) + 100
+    if y in (6, 7, 8):  startY = (y * 57) + 165
+    return startX, startY
+
+
+class BoardRenderer:
+    """Draws boards onto a surface, redrawing only the squares that changed.
+
+    A square shows its digit once solved and is blank otherwise. Each kind of
+    square (blank or one of the digits) is rendered once and cached, so a frame
+    costs two blits per changed square. The surface can be the display or any
+    offscreen pygame.Surface, in which case no window is needed."""
+    def __init__(self, surface, background=None):
+        self.surface = surface
+        if background is None:
+            background = pygame.image.load(os.path.join(here, "images", "sudoku-board-bare.jpg"))
+            if pygame.display.get_surface() is not None:
+                background = background.convert()
+        self.background = background
+        self.font = pygame.font.SysFont('opensans', 21)
+        self.tiles = {}
+        self.rects = {}
+        for y in range(9):
+            for x in range(9):
+                startX, startY = square_position(x, y)
+                self.rects[rows[y] + digits[x]] = pygame.Rect(startX, startY, 45, 40)
+        # box -> digit shown, None for a blank square; empty until the first draw
+        self.shown = {}
+
+    def tile(self, number):
+        if number not in self.tiles:
+            tile = pygame.Surface((45, 40), pygame.SRCALPHA)
+            square = SudokuSquare.SudokuSquare(number, font=self.font)
+            square.draw(tile)
+            self.tiles[number] = tile
+        return self.tiles[number]
+
+    def update(self, changes):
+        """Redraw the boxes of changes, an iterable of (box, value) pairs, whose
+        displayed digit differs from the one shown. Returns the rects redrawn."""
+        dirty = []
+        for box, value in changes:
+            number = value if len(value) == 1 and value != '.' else None
+            if box in self.shown and self.shown[box] == number:
+                continue
+            self.shown[box] = number
+            rect = self.rects[box]
+            self.surface.blit(self.background, rect, rect)
+            self.surface.blit(self.tile(number), rect)
+            dirty.append(rect)
+        return dirty
+
+    def draw(self, values):
+        """Bring the surface to the board values (box -> digits). The first call
+        draws the whole board. Returns the rects redrawn."""
+        if not self.shown:
+            self.surface.blit(self.background, (0, 0))
+            self.update(values.items())
+            return [self.surface.get_rect()]
+        return self.update(values.items())
+
 
 def play(values_list):
     pygame.init()
 
-
-    size = width, height = 700, 700
     screen = pygame.display.set_mode(size)
-
-    background_image = pygame.image.load("./images/sudoku-board-bare.jpg").convert()
+    renderer = BoardRenderer(screen)
 
     clock = pygame.time.Clock()
 
-    # The puzzleNumber sets a seed so either generate
-    # a random number to fill in here or accept user
-    # input for a duplicatable puzzle.
-
     for values in values_list:
         pygame.event.pump()
-        theSquares = []
-        initXLoc = 0
-        initYLoc = 0
-        startX, startY, editable, number = 0, 0, "N", 0
-        for y in range(9):
-            for x in range(9):
-                if x in (0, 1, 2):  startX = (x * 57) + 38
-                if x in (3, 4, 5):  startX = (x * 57) + 99
-                if x in (6, 7, 8):  startX = (x * 57) + 159
-
-                if y in (0, 1, 2):  startY = (y * 57) + 35
-                if y in (3, 4, 5):  startY = (y * 57) + 100
-                if y in (6, 7, 8):  startY = (y * 57) + 165
-                col = digits[x]
-                row = rows[y]
-                string_number = values[row + col]
-                if len(string_number) > 1 or string_number == '' or string_number == '.':
-                    number = None
-                else:
-                    number = int(string_number)
-                theSquares.append(SudokuSquare.SudokuSquare(number, startX, startY, editable, x, y))
-
-        screen.blit(background_image, (0, 0))
-        for num in theSquares:
-            num.draw()
-
-        pygame.display.flip()
-        pygame.display.update()
-        clock.tick(5)
+        dirty = renderer.draw(values)
+        if dirty:
+            pygame.display.update(dirty)
+            clock.tick(5)
 
     # leave game showing until closed by user
     while True:
@@ -61,6 +104,48 @@ def play(values_list):
                 pygame.quit()
                 quit()
 
+
+def render(values_list, output, fps=5):
+    """Render a sequence of boards offscreen, without opening a window.
+
+    output is either a GIF file name, which needs Pillow, or a file name pattern
+    with a %d for the frame number (e.g. 'frames/%04d.png'). Boards that change
+    nothing on screen make no frame. A GIF is written in one go, so it keeps at
+    most MAX_GIF_FRAMES frames: a longer trace is thinned out to every 2nd, 4th,
+    ... frame, shown for as much longer, and always ends on the last board.
+    Returns the number of frames written."""
+    pygame.font.init()
+    surface = pygame.Surface(size)
+    renderer = BoardRenderer(surface)
+    gif = output.lower().endswith('.gif')
+    if gif:
+        from PIL import Image
+        frames = []
+        step = 1            # every step-th frame is kept
+
+        def grab():
+            return Image.frombytes('RGB', size, pygame.image.tobytes(surface, 'RGB')).quantize()
+    count = 0
+    for values in values_list:
+        if not renderer.draw(values):
+            continue
+        if not gif:
+            pygame.image.save(surface, output % count)
+        elif count % step == 0:
+            frames.append(grab())
+            if len(frames) == MAX_GIF_FRAMES:
+                del frames[1::2]
+                step *= 2
+        count += 1
+    if not gif:
+        return count
+    if count and (count - 1) % step:
+        frames.append(grab())
+    if frames:
+        frames[0].save(output, save_all=True, append_images=frames[1:], duration=1000 * step // fps, loop=0)
+    return len(frames)
+
+
 if __name__ == "__main__":
     main()
-    sys.exit()
\ No newline at end of file
+    sys.exit()
@@ -0,0 +1,141 @@
+"""
+Vectorized propagation of many boards at once, with NumPy.
+
+B boards are held as a (B, cells) uint16 array of candidate bitmasks, the same masks
+as the bitmask engine of solution.py. Eliminate and only choice run on the whole
+array at a time over index arrays built from the topology's peers and units, until
+no board changes. Most easy grids are solved by then; only the boards left
+unsolved go on to solution.search_bits(), one at a time.
+
+There is no naked twins rule here, so a board can stop short of the fixed point
+the scalar engine's propagation reaches; the search that finishes it runs that
+propagation anyway, so the solutions are the same.
+
+NumPy is optional: solution.py does not need this module, and importing it without
+NumPy installed raises ImportError.
+"""
+import numpy as np
+
+import solution
+
+# Topology -> Tables
+tables = {}
+
+
+class Tables(object):
+    """
+    Index arrays of a Topology for the vectorized rules. Ragged rows (diagonal boxes
+    have more peers and units than the others) are padded with the index of an extra
+    column that always holds 0.
+        peers       (cells, max peers) peer indices of each box
+        units       (units, digits) box indices of each unit
+        box_slots   (cells, max units) positions of each box in units.ravel()
+        popcount    mask -> number of candidates
+    """
+    def __init__(self, topo):
+        if len(topo.digits) > 16:
+            raise ValueError('candidate masks of %d digits do not fit in uint16' % len(topo.digits))
+        pad = topo.cells
+        width = max(len(p) for p in topo.peer_indices)
+        self.peers = np.array([p + (pad,) * (width - len(p)) for p in topo.peer_indices], dtype=np.intp)
+        self.units = np.array(topo.unit_indices, dtype=np.intp)
+        n = len(topo.digits)
+        slots = [[u * n + topo.unit_indices[u].index(b) for u in topo.box_units[b]]
+                 for b in range(topo.cells)]
+        width = max(len(s) for s in slots)
+        pad = self.units.size
+        self.box_slots = np.array([s + [pad] * (width - len(s)) for s in slots], dtype=np.intp)
+        self.popcount = np.array([bin(m).count('1') for m in range(topo.all_digits + 1)], dtype=np.uint8)
+        # grid byte -> mask, 0 for bytes that are not cells
+        self.byte_masks = np.zeros(256, dtype=np.uint16)
+        for c, m in topo.cell_masks.items():
+            if isinstance(c, int):
+                self.byte_masks[c] = m
+
+
+def get_tables(topo):
+    if topo not in tables:
+        tables[topo] = Tables(topo)
+    return tables[topo]
+
+
+def grids_array(grids, topo=solution.diagonal_topology):
+    """
+    Convert grids, as str or bytes, into a (B, cells) uint16 array of candidate masks.
+    Raises ValueError if a grid has the wrong length or a character that is neither
+    a digit nor an empty marker.
+    """
+    raw = b''.join(g.encode('ascii') if isinstance(g, str) else bytes(g) for g in grids)
+    if len(raw) != len(grids) * topo.cells:
+        raise ValueError('every grid must have %d boxes' % topo.cells)
+    cells = get_tables(topo).byte_masks[np.frombuffer(raw, dtype=np.uint8)]
+    if not cells.all():
+        raise ValueError('unknown character in grid')
+    return cells.reshape(len(grids), topo.cells)
+
+
+def propagate_batch(cells, topo=solution.diagonal_topology):
+    """
+    Run eliminate and only choice on every board of a (B, cells) uint16 array, in
+    place, until none of them changes.
+    Output: A (B,) bool array, True for boards that hit a contradiction. Their
+            candidates are left in whatever state the contradiction was found in.
+    """
+    t = get_tables(topo)
+    failed = np.zeros(len(cells), dtype=bool)
+    # boards still changing; the others are done, or failed
+    active = np.arange(len(cells))
+    while len(active):
+        work = cells[active]
+        before = work.copy()
+        boards = len(work)
+        # eliminate: remove from every box the digits of its solved peers
+        padded = np.zeros((boards, topo.cells + 1), dtype=np.uint16)
+        padded[:, :-1] = np.where(t.popcount[work] == 1, work, 0)
+        work &= ~np.bitwise_or.reduce(padded[:, t.peers], axis=2)
+        # only choice: a digit seen once in a unit goes to the box holding it
+        in_units = work[:, t.units]
+        once = np.zeros((boards, len(t.units)), dtype=np.uint16)
+        twice = np.zeros_like(once)
+        for k in range(in_units.shape[2]):
+            twice |= once & in_units[:, :, k]
+            once |= in_units[:, :, k]
+        hits = np.zeros((boards, t.units.size + 1), dtype=np.uint16)
+        hits[:, :-1] = (in_units & (once & ~twice)[:, :, None]).reshape(boards, -1)
+        assigned = np.bitwise_or.reduce(hits[:, t.box_slots], axis=2)
+        work = np.where(assigned != 0, assigned, work)
+        bad = ((once != topo.all_digits).any(axis=1) | (t.popcount[assigned] > 1).any(axis=1)
+               | (work == 0).any(axis=1))
+        cells[active] = work
+        failed[active[bad]] = True
+        active = active[~bad & (work != before).any(axis=1)]
+    return failed
+
+
+def solve_batch(grids, topo=solution.diagonal_topology, search=True):
+    """
+    Solve many grids, propagating them all at once first.
+    Args:
+        grids: a sequence of grids, as str or bytes.
+        topo(Topology): the board size and variant of every grid, at most 16 x 16.
+        search(bool): search the grids propagation leaves unsolved; if False they
+            get None, for the caller to search as it sees fit.
+    Returns:
+        A list with, for every grid, the dictionary representation of its solution or
+        False, the same as solve() would give.
+    """
+    cells = grids_array(grids, topo)
+    failed = propagate_batch(cells, topo)
+    solved = (get_tables(topo).popcount[cells] == 1).all(axis=1)
+    results = []
+    for board, bad, done in zip(cells.tolist(), failed.tolist(), solved.tolist()):
+        if bad:
+            results.append(False)
+            continue
+        if not done:
+            if not search:
+                results.append(None)
+                continue
+            board = solution.search_bits(board, None, topo)
+        results.append(solution.bits_values(board, topo) if board else False)
+    return results
@@ -0,0 +1,183 @@
+"""
+Benchmark harness for the sudoku solver.
+
+    python benchmark.py [-n 50] [--seed 1] [-c] [-o results.json] [--baseline old.json]
+
+Every strategy is run over graded corpora of diagonal puzzles:
+    samples   the sample grid of solution.py with a diagonal solution
+    easy      random puzzles reduced to 40 clues
+    hard      random puzzles reduced to 24 clues, or until no clue can go
+    minimal   random puzzles reduced until no clue can go
+
+Every generated puzzle has a unique solution, see generator.reduce_clues().
+
+For each corpus and strategy it reports solves per second, p50/p99 latency in ms and,
+per puzzle, search nodes and propagations (rule passes for the bitmask engine, boxes
+and units processed for the dictionary one, none for dancing links). Every other
+counter of solve(stats=...) is averaged per puzzle under 'counters' and printed with
+--counters. Results are written as JSON with -o, and --baseline prints the speedup
+against such a file from an earlier commit.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import generator
+import solution
+
+CORPORA = ('samples', 'easy', 'hard', 'minimal')
+
+
+def solve_bitmask(grid, stats):
+    return solution.solve(grid, stats=stats)
+
+
+def solve_subsets(grid, stats):
+    return solution.solve(grid, stats=stats, engine='subsets')
+
+
+def solve_dict(grid, stats):
+    return solution.search(solution.grid_values(grid), stats=stats)
+
+
+def solve_dlx(grid, stats):
+    return solution.solve(grid, stats=stats, engine='dlx')
+
+
+# strategy name -> function(grid, stats Counter) returning the solution or a false value
+strategies = {
+    'bitmask': solve_bitmask,
+    'subsets': solve_subsets,
+    'dict': solve_dict,
+    'dlx': solve_dlx,
+}
+
+
+def build_corpora(n, seed):
+    """
+    Map each corpus name to its list of grids; the same n and seed give the same grids.
+    """
+    rng = random.Random(seed)
+    boards = [generator.random_board(rng) for _ in range(n)]
+    return {
+        # the other sample grids are classic puzzles, unsolvable on the diagonal board
+        'samples': solution.sample_grids[:1],
+        'easy': [generator.reduce_clues(rng, board, 40) for board in boards],
+        'hard': [generator.reduce_clues(rng, board, 24) for board in boards],
+        'minimal': [generator.reduce_clues(rng, board) for board in boards],
+    }
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100. * (len(sorted_values) - 1))))]
+
+
+def run_strategy(solve, grids):
+    """
+    Solve every grid with solve and return the summary of one corpus/strategy pair.
+    """
+    times = []
+    stats = Counter()
+    solved = 0
+    for grid in grids:
+        start = time.perf_counter()
+        values = solve(grid, stats)
+        times.append(time.perf_counter() - start)
+        solved += bool(values)
+    times.sort()
+    total = sum(times)
+    return {
+        'puzzles': len(grids),
+        'solved': solved,
+        'seconds': total,
+        'solves_per_sec': len(grids) / total if total else 0.,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'nodes': stats['nodes'] / float(len(grids)),
+        'propagations': stats['propagations'] / float(len(grids)),
+        'counters': dict((k, v / float(len(grids))) for k, v in sorted(stats.items())),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(n=50, seed=1, names=None):
+    """
+    Run the benchmark and return its results as a JSON-ready dict.
+    """
+    corpora = build_corpora(n, seed)
+    results = {}
+    for corpus in CORPORA:
+        results[corpus] = {}
+        for name in names or sorted(strategies):
+            results[corpus][name] = run_strategy(strategies[name], corpora[corpus])
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'n': n,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def report(results, baseline=None, out=sys.stdout, counters=False):
+    header = '%-8s %-8s %6s %6s %10s %9s %9s %9s %9s' % (
+        'corpus', 'strategy', 'n', 'solved', 'solves/s', 'p50 ms', 'p99 ms', 'nodes', 'props')
+    if baseline:
+        header += '   vs baseline'
+    print(header, file=out)
+    for corpus, by_strategy in results['results'].items():
+        for name, r in sorted(by_strategy.items()):
+            line = '%-8s %-8s %6d %6d %10.1f %9.3f %9.3f %9.1f %9.1f' % (
+                corpus, name, r['puzzles'], r['solved'], r['solves_per_sec'],
+                r['p50_ms'], r['p99_ms'], r['nodes'], r['propagations'])
+            old = baseline and baseline['results'].get(corpus, {}).get(name)
+            if old and old['solves_per_sec']:
+                line += '   %.2fx' % (r['solves_per_sec'] / old['solves_per_sec'])
+            print(line, file=out)
+            if counters:
+                for key, value in sorted(r.get('counters', {}).items()):
+                    print('%19s %-22s %12.6g' % ('', key, value), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the sudoku solver strategies.')
+    parser.add_argument('-n', type=int, default=50, help='puzzles per generated corpus')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the generated corpora')
+    parser.add_argument('-s', '--strategy', action='append', choices=sorted(strategies),
+                        help='strategy to run, may be repeated; all by default')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('-c', '--counters', action='store_true',
+                        help='also print every counter, per puzzle')
+    args = parser.parse_args(argv)
+
+    results = run(args.n, args.seed, args.strategy)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline, counters=args.counters)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Canonical forms of 9 x 9 grids and a solution cache keyed by them.
+
+Two grids are equivalent when one turns into the other by relabelling digits and
+moving boxes around in a way that maps every unit onto a unit. For the diagonal
+board the box moves kept here are those that also keep both diagonals:
+    - the same permutation p of rows and of columns, where p keeps bands together
+      and commutes with i -> 8 - i (swapping the outer bands, rows 3 and 5, and
+      rearranging the rows of band 0 as long as band 2 mirrors it): 24 of them
+    - optionally followed by mirroring the columns (which swaps the two diagonals)
+    - optionally followed by transposing.
+That makes 96 moves. They keep classic units too, so classic grids get the same
+(partial) treatment. The canonical form of a grid is the smallest string among
+its moved grids, each relabelled in order of first appearance; equivalent grids
+share it, and SolutionCache solves each form once.
+"""
+from collections import OrderedDict
+from itertools import permutations, product
+from operator import itemgetter
+
+import solution
+
+# Topology -> tuple of moves, each a tuple of box indices: moved[i] = grid[move[i]]
+symmetry_tables = {}
+# Topology -> an itemgetter per move, which applies it to a grid
+move_getters = {}
+
+
+def row_permutations(size):
+    """
+    Row permutations of a board of size x size squares that keep bands together and
+    commute with i -> n - 1 - i, so the same one on rows and columns keeps both
+    diagonals.
+    """
+    n = size * size
+    n_rows = range(size)
+    result = []
+    for bands in permutations(range(size)):
+        for within in product(*[list(permutations(n_rows))] * size):
+            p = [bands[i // size] * size + within[i // size][i % size] for i in range(n)]
+            if all(p[n - 1 - i] == n - 1 - p[i] for i in range(n)):
+                result.append(tuple(p))
+    return result
+
+
+def symmetries(topo=solution.diagonal_topology):
+    """
+    The box moves of canonical_form(), for a 9 x 9 Topology.
+    """
+    if topo.size != 3:
+        raise ValueError('canonical forms are only built for 9 x 9 boards')
+    if topo not in symmetry_tables:
+        n = len(topo.digits)
+        moves = []
+        for p in row_permutations(topo.size):
+            for mirror in (False, True):
+                for transpose in (False, True):
+                    move = []
+                    for r in range(n):
+                        for c in range(n):
+                            row, col = (c, r) if transpose else (r, c)
+                            if mirror:
+                                col = n - 1 - col
+                            move.append(p[row] * n + p[col])
+                    moves.append(tuple(move))
+        symmetry_tables[topo] = tuple(sorted(set(moves)))
+        move_getters[topo] = tuple(itemgetter(*m) for m in symmetry_tables[topo])
+    return symmetry_tables[topo]
+
+
+def normalize(grid):
+    """
+    A grid as str, with '.' for every empty box.
+    """
+    if not isinstance(grid, str):
+        grid = bytes(grid).decode('ascii')
+    return grid.replace('0', '.')
+
+
+def canonical_form(grid, topo=solution.diagonal_topology):
+    """
+    Find the canonical form of a grid.
+    Args:
+        grid: a grid string, or bytes.
+        topo(Topology): a 9 x 9 board.
+    Returns:
+        (key, move, labels): key is the canonical grid string, equal for every grid
+        equivalent to this one; key[i] is labels-relabelled grid[move[i]], and
+        labels holds, in canonical digit order, the grid digits they stand for.
+    """
+    grid = normalize(grid)
+    digits = topo.digits
+    best = None
+    for move, get in zip(symmetries(topo), move_getters[topo]):
+        moved = ''.join(get(grid))
+        labels = ''.join(dict.fromkeys(moved.replace('.', '')))
+        key = moved.translate(str.maketrans(labels, digits[:len(labels)]))
+        if best is None or key < best[0]:
+            best = (key, move, labels)
+    return best
+
+
+class SolutionCache(object):
+    """
+    A size-bounded, least recently used cache in front of solution.solve(), keyed
+    by canonical form, so a grid equivalent to one solved before is answered by
+    mapping the stored solution back instead of searching again. Grids without a
+    solution are cached as such. For a grid with several solutions, the answer is
+    one of them, not necessarily the one solve() would give.
+
+    Metrics: hits, misses and evictions count lookups and entries pushed out by
+    maxsize; metrics() returns them with the size and hit rate.
+    """
+    def __init__(self, maxsize=10000, topo=solution.diagonal_topology, engine=None):
+        symmetries(topo)
+        self.maxsize = maxsize
+        self.topo = topo
+        self.engine = engine
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def solve(self, grid):
+        """
+        Same as solution.solve(grid), with this cache's topology and engine.
+        """
+        topo = self.topo
+        assert len(grid) == topo.cells
+        key, move, labels = canonical_form(grid, topo)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            solved = self.entries[key]
+        else:
+            self.misses += 1
+            values = solution.solve(grid, topo=topo, engine=self.engine)
+            solved = False
+            if values:
+                # relabel the moved solution; digits missing from the grid get the
+                # labels left over, in order of first appearance
+                moved = ''.join([values[topo.boxes[j]] for j in move])
+                labels += ''.join(d for d in dict.fromkeys(moved) if d not in labels)
+                solved = moved.translate(str.maketrans(labels, topo.digits))
+            self.entries[key] = solved
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        if not solved:
+            return False
+        labels += ''.join(d for d in topo.digits if d not in labels)
+        unlabel = str.maketrans(topo.digits, labels)
+        values = {}
+        for i, j in enumerate(move):
+            values[topo.boxes[j]] = solved[i].translate(unlabel)
+        return values
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'hit_rate': self.hits / float(lookups) if lookups else 0.,
+        }
@@ -0,0 +1,203 @@
+"""
+Dancing-links backend: a board as an exact-cover problem, solved with Knuth's
+Algorithm X on a doubly linked node matrix.
+
+Every (box, digit) placement is a row; it covers one column for its box (the box
+holds exactly one digit) and one for each (unit, digit) pair of the box's units (the
+digit appears exactly once in the unit). The diagonals of a 'diagonal' topology are
+units like any other, so they need no special treatment. The search always branches
+on the column with the fewest rows left, with no heuristics that can stall, so its
+running time depends on the puzzle far less than the propagating searches do.
+
+Nodes are indices into flat lists (left, right, up, down, column) rather than
+objects; the matrix of a topology is built once and copied for every solve.
+"""
+from topology import get_topology
+
+
+class ExactCover(object):
+    """
+    The exact-cover matrix of a Topology, untouched by solving.
+    Node 0 is the root, nodes 1 to columns are the column headers, and every row
+    takes the next 1 + len(units of its box) nodes, linked in a circle.
+    """
+    def __init__(self, topo):
+        n = len(topo.digits)
+        self.topo = topo
+        self.columns = columns = topo.cells + len(topo.unit_indices) * n
+        left = [columns] + list(range(columns))
+        right = list(range(1, columns + 1)) + [0]
+        up = list(range(columns + 1))
+        down = list(range(columns + 1))
+        column = list(range(columns + 1))
+        size = [0] * (columns + 1)
+        row_of = [-1] * (columns + 1)
+        row_start = []
+        for b in range(topo.cells):
+            unit_columns = [topo.cells + 1 + u * n for u in topo.box_units[b]]
+            for d in range(n):
+                first = len(column)
+                row_start.append(first)
+                row_columns = [b + 1] + [c + d for c in unit_columns]
+                last = first + len(row_columns) - 1
+                for node, c in enumerate(row_columns, first):
+                    column.append(c)
+                    row_of.append(b * n + d)
+                    up.append(up[c])
+                    down.append(c)
+                    down[up[c]] = node
+                    up[c] = node
+                    size[c] += 1
+                    left.append(node - 1 if node > first else last)
+                    right.append(node + 1 if node < last else first)
+        self.links = (left, right, up, down, column, size)
+        self.row_of = tuple(row_of)
+        self.row_start = tuple(row_start)
+
+    def solutions(self, cells, stats=None, budget=None):
+        """
+        Yield every solution of a board in bitmask form (see solution.grid_bits()),
+        as a new list of single-bit masks. Boxes with one candidate are placed, and
+        rows of candidates missing from the others are dropped before searching.
+        stats, a Counter, gets search 'nodes', 'branches' and 'backtracks', and
+        budget, a solution.Budget, is checked at every node.
+        """
+        left, right, up, down, column, size = [list(a) for a in self.links]
+        row_of, row_start = self.row_of, self.row_start
+        n = len(self.topo.digits)
+
+        def cover(c):
+            left[right[c]] = left[c]
+            right[left[c]] = right[c]
+            i = down[c]
+            while i != c:
+                j = right[i]
+                while j != i:
+                    down[up[j]] = down[j]
+                    up[down[j]] = up[j]
+                    size[column[j]] -= 1
+                    j = right[j]
+                i = down[i]
+
+        def uncover(c):
+            i = up[c]
+            while i != c:
+                j = left[i]
+                while j != i:
+                    size[column[j]] += 1
+                    down[up[j]] = j
+                    up[down[j]] = j
+                    j = left[j]
+                i = up[i]
+            left[right[c]] = c
+            right[left[c]] = c
+
+        def place(r):
+            # cover every column of row r, or return False if one is already covered
+            # (two clues claim the same box, or the same digit in a unit)
+            i = row_start[r]
+            j = i
+            while True:
+                c = column[j]
+                if right[left[c]] != c:
+                    return False
+                cover(c)
+                j = right[j]
+                if j == i:
+                    return True
+
+        def drop(r):
+            # unlink row r from its columns, for a candidate ruled out up front
+            i = row_start[r]
+            j = i
+            while True:
+                if down[up[j]] == j:
+                    down[up[j]] = down[j]
+                    up[down[j]] = up[j]
+                    size[column[j]] -= 1
+                j = right[j]
+                if j == i:
+                    return
+
+        chosen = []
+        for b, c in enumerate(cells):
+            if not c:
+                return
+            if not c & (c - 1):
+                r = b * n + c.bit_length() - 1
+                if not place(r):
+                    return
+                chosen.append(r)
+        for b, c in enumerate(cells):
+            if c & (c - 1):
+                for d in range(n):
+                    if not c >> d & 1:
+                        drop(b * n + d)
+
+        def search():
+            if stats is not None:
+                stats['nodes'] += 1
+            if budget is not None:
+                budget.check()
+            c = right[0]
+            if c == 0:
+                result = [0] * len(cells)
+                for r in chosen:
+                    result[r // n] = 1 << r % n
+                yield result
+                return
+            best, best_size = c, size[c]
+            while c and best_size > 1:
+                if size[c] < best_size:
+                    best, best_size = c, size[c]
+                c = right[c]
+            if not best_size:
+                return
+            if stats is not None:
+                stats['branches'] += 1
+            cover(best)
+            i = down[best]
+            while i != best:
+                j = right[i]
+                while j != i:
+                    cover(column[j])
+                    j = right[j]
+                chosen.append(row_of[i])
+                found = False
+                for result in search():
+                    found = True
+                    yield result
+                chosen.pop()
+                if not found and stats is not None:
+                    stats['backtracks'] += 1
+                j = left[i]
+                while j != i:
+                    uncover(column[j])
+                    j = left[j]
+                i = down[i]
+            uncover(best)
+
+        yield from search()
+
+
+# Topology -> ExactCover
+matrices = {}
+
+
+def exact_cover(topo=None):
+    """
+    The ExactCover matrix of a Topology (9 x 9 diagonal by default), built on first use.
+    """
+    if topo is None:
+        topo = get_topology()
+    if topo not in matrices:
+        matrices[topo] = ExactCover(topo)
+    return matrices[topo]
+
+
+def search_dlx(cells, topo=None, stats=None, budget=None):
+    """
+    Solve a board in bitmask form with dancing links.
+    Output: The solved list of bitmasks, or False if no solution exists.
+    """
+    return next(exact_cover(topo).solutions(cells, stats, budget), False)
@@ -0,0 +1,140 @@
+"""
+Random puzzle generator, for building large corpora to load the solver with.
+
+    python generator.py [-n 1000] [--clues 24] [--classic] [--size 3] [--seed 1] [-j 4] [-o puzzles.txt]
+
+Every puzzle has exactly one solution. It starts from a random solved board and
+clues are taken away in random order, as long as the solution stays unique, until
+the target count is reached or no clue can go (a minimal puzzle, which may hold more
+clues than asked for). Puzzles are generated in parallel, one process per core by
+default; the output only depends on the seed, not on the number of workers.
+"""
+import argparse
+import os
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import solution
+from topology import get_topology
+
+
+def random_board(rng, topo=solution.diagonal_topology):
+    """
+    A random solved board, as a grid string: a few random clues are solved
+    (retrying until they are consistent), then the digits are relabelled.
+    """
+    digits = topo.digits
+    while True:
+        grid = ['.'] * topo.cells
+        for i in rng.sample(range(topo.cells), len(digits) + 2):
+            grid[i] = rng.choice(digits)
+        values = solution.solve(''.join(grid), topo=topo)
+        if values:
+            break
+    relabel = dict(zip(digits, rng.sample(digits, len(digits))))
+    return ''.join(relabel[values[s]] for s in topo.boxes)
+
+
+def reduce_clues(rng, board, clues=0, topo=solution.diagonal_topology):
+    """
+    Take clues away from board, a grid string with a unique solution, in random
+    order while the solution stays unique, down to clues of them if possible.
+    A clue can go if no solution has another digit in its box, which one search
+    with that digit ruled out tells, without counting solutions.
+    """
+    cells = solution.grid_bits(board, topo)
+    remaining = sum(1 for c in cells if c != topo.all_digits)
+    for i in rng.sample(range(topo.cells), topo.cells):
+        if remaining <= clues:
+            break
+        digit = cells[i]
+        if digit == topo.all_digits:
+            continue
+        cells[i] = topo.all_digits & ~digit
+        if solution.search_bits(cells[:], None, topo):
+            cells[i] = digit
+        else:
+            cells[i] = topo.all_digits
+            remaining -= 1
+    mask_digits = topo.mask_digits
+    return ''.join(mask_digits[c] if c != topo.all_digits else '.' for c in cells)
+
+
+def generate_one(seed, index, clues=0, topo=solution.diagonal_topology):
+    """
+    Puzzle number index of the run seeded with seed.
+    """
+    rng = random.Random('%d:%d' % (seed, index))
+    return reduce_clues(rng, random_board(rng, topo), clues, topo)
+
+
+def generate_chunk(seed, indices, clues, topo):
+    return [generate_one(seed, i, clues, topo) for i in indices]
+
+
+def generate(n, clues=0, topo=solution.diagonal_topology, seed=None, workers=None, chunksize=8):
+    """
+    Generate n puzzles with a unique solution, fanning the work out to a pool of processes.
+    Args:
+        n(int): number of puzzles.
+        clues(int): target number of clues; 0 for minimal puzzles.
+        topo(Topology): the board size and variant, see topology.get_topology().
+        seed(int): the same seed gives the same puzzles; random by default.
+        workers(int): number of processes, os.cpu_count() by default. With 1 (or 0)
+            everything runs in the calling process.
+        chunksize(int): number of puzzles a worker makes at a time.
+    Returns:
+        A generator of grid strings, '.' for empty boxes.
+    """
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for i in range(n):
+            yield generate_one(seed, i, clues, topo)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in solution.chunked(range(n), chunksize):
+            pending.append(pool.submit(generate_chunk, seed, chunk, clues, topo))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate sudoku puzzles with a unique solution.')
+    parser.add_argument('-n', type=int, default=1000, help='number of puzzles')
+    parser.add_argument('--clues', type=int, default=0,
+                        help='target number of clues; minimal puzzles by default')
+    parser.add_argument('--size', type=int, default=3,
+                        help='square size: 3 for 9x9 (default), 4 for 16x16, 5 for 25x25')
+    parser.add_argument('--classic', action='store_true', help='no diagonal constraints')
+    parser.add_argument('--seed', type=int, default=None, help='random by default')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes, one per CPU by default')
+    parser.add_argument('-o', '--output', help='write the puzzles to this file instead of stdout')
+    args = parser.parse_args(argv)
+    try:
+        topo = get_topology(args.size, 'classic' if args.classic else 'diagonal')
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for grid in generate(args.n, args.clues, topo, args.seed, args.workers):
+            out.write(grid + '\n')
+    finally:
+        if out is sys.stdout:
+            out.flush()
+        else:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
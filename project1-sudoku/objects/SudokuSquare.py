@@ -43,7 +43,7 @@ def AAfilledRoundedRect(surface,rect,color,radius=0.4):
 
 class SudokuSquare:
     """A sudoku square class."""
-    def __init__(self, number=None, offsetX=0, offsetY=0, edit="Y", xLoc=0, yLoc=0):
+    def __init__(self, number=None, offsetX=0, offsetY=0, edit="Y", xLoc=0, yLoc=0, font=None):
         if number != None:
             number = str(number)
             self.color = (2, 204, 186)
@@ -51,7 +51,8 @@ class SudokuSquare:
             number = ""
             self.color = (255, 255, 255)
         # print("FONTS", pygame.font.get_fonts())
-        self.font = pygame.font.SysFont('opensans', 21)
+        # looking the font up is slow, pass one in when making many squares
+        self.font = font or pygame.font.SysFont('opensans', 21)
         self.text = self.font.render(number, 1, (255, 255, 255))
         self.textpos = self.text.get_rect()
         self.textpos = self.textpos.move(offsetX + 17, offsetY + 4)
@@ -70,8 +71,9 @@ class SudokuSquare:
         self.offsetX = offsetX
         self.offsetY = offsetY
 
-    def draw(self):
-        screen = pygame.display.get_surface()
+    def draw(self, screen=None):
+        if screen is None:
+            screen = pygame.display.get_surface()
         AAfilledRoundedRect(screen, (self.offsetX, self.offsetY, 45, 40), self.color)
 
         # screen.blit(self.collide, self.collideRect)
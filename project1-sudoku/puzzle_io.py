@@ -0,0 +1,115 @@
+"""
+Streaming readers and writers for puzzle files.
+
+Text files hold one grid per line in the '.'/'0' encoding accepted by grid_values();
+blank lines and lines starting with '#' are skipped. The binary form packs a grid
+into 41 bytes, two cells per byte (high nibble first, 0 for an empty box), with no
+separators between records.
+
+Regular files are memory-mapped and grids are handed out as bytes slices of the map,
+which solution.solve() accepts as they are, so no str is built per line.
+"""
+import mmap
+import sys
+
+GRID_SIZE = 81
+RECORD_SIZE = (GRID_SIZE + 1) // 2
+
+# byte -> the two ASCII cells it packs
+nibble_pairs = tuple(bytes((48 + (b >> 4), 48 + (b & 15))) for b in range(256))
+
+
+def pack_grid(grid):
+    """
+    Pack a grid in string or bytes form into a RECORD_SIZE bytes record.
+    """
+    if isinstance(grid, str):
+        grid = grid.encode('ascii')
+    cells = [0 if g in b'.0' else g - 48 for g in grid] + [0]
+    return bytes(cells[i] << 4 | cells[i + 1] for i in range(0, GRID_SIZE, 2))
+
+
+def unpack_grid(record):
+    """
+    Unpack a binary record into an 81 bytes grid, '0' for empty boxes.
+    """
+    return b''.join(map(nibble_pairs.__getitem__, record))[:GRID_SIZE]
+
+
+def map_file(f):
+    """
+    Memory-map an open binary file for reading. Returns None when the file cannot
+    be mapped (pipes, terminals, empty files), in which case it must be streamed.
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def iter_text(buf):
+    """
+    Yield the grids of a text buffer (bytes or mmap) as bytes, without the line ending.
+    """
+    start, size = 0, len(buf)
+    while start < size:
+        end = buf.find(b'\n', start)
+        if end < 0:
+            end = size
+        stop = end - 1 if end > start and buf[end - 1] == 13 else end  # '\r'
+        if stop > start and buf[start] != 35:  # '#'
+            yield buf[start:stop]
+        start = end + 1
+
+
+def iter_binary(buf):
+    """
+    Yield the grids of a binary buffer as bytes. A truncated trailing record is
+    yielded as is so that solving it reports an error.
+    """
+    for start in range(0, len(buf), RECORD_SIZE):
+        yield unpack_grid(buf[start:start + RECORD_SIZE])
+
+
+def iter_stream(f, binary=False):
+    """
+    Same as iter_text()/iter_binary() but for a file that cannot be memory-mapped.
+    """
+    if binary:
+        record = f.read(RECORD_SIZE)
+        while record:
+            yield unpack_grid(record)
+            record = f.read(RECORD_SIZE)
+    else:
+        for line in f:
+            line = line.rstrip(b'\r\n')
+            if line and not line.startswith(b'#'):
+                yield line
+
+
+def read_grids(path, binary=False):
+    """
+    Yield every grid of a puzzle file as bytes, lazily.
+    Args:
+        path(str): the file to read, '-' for stdin.
+        binary(bool): the file holds packed records instead of text lines.
+    """
+    f = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        buf = map_file(f)
+        if buf is None:
+            yield from iter_stream(f, binary)
+        else:
+            with buf:
+                yield from (iter_binary(buf) if binary else iter_text(buf))
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+
+def write_binary(grids, out):
+    """
+    Write grids to the binary file out as packed records.
+    """
+    for grid in grids:
+        out.write(pack_grid(grid))
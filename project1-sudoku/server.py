@@ -0,0 +1,256 @@
+"""
+A small asyncio HTTP front end to solution.solve().
+
+    python server.py [--host 127.0.0.1] [--port 8080] [-j 4] [--queue 64] [--timeout 10]
+
+POST /solve with a grid as the request body answers with JSON:
+    {"grid": ..., "solution": "<one char per box>" or null, "seconds": ..., "error": ...}
+with status 200 when solved or unsolvable (solution null), 400 for a malformed grid
+or request, 408 when the request is not received within the timeout, 503 when the
+queue is full, 504 when the request timed out and 500 when solving
+failed (e.g. a worker process died). GET /metrics returns the request counters as JSON.
+A pool that lost a worker is replaced, so the requests after it are served again.
+
+Solving runs in a pool of worker processes fed from a bounded queue: when the queue
+is full, new requests are turned away at once instead of piling up. A request
+that times out is dropped from the queue if it has not started yet, and a search
+stops by itself once it has run for the timeout, so no grid holds a worker longer.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from collections import Counter
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import solution
+from topology import get_topology
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           408: 'Request Timeout', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+MAX_BODY = 1 << 16
+# longest request or header line
+MAX_LINE = 1 << 16
+
+
+class SolveServer(object):
+    """
+    Accepts HTTP requests and solves their grids in a process pool.
+    Args:
+        workers(int): worker processes, os.cpu_count() by default.
+        queue_size(int): grids waiting for a worker at most; more get a 503.
+        timeout(float): seconds a request may take, queueing included, and seconds
+            a client may take to send it.
+        topo(Topology): the board size and variant of every grid.
+        engine(str): the solve() backend.
+    """
+    def __init__(self, workers=None, queue_size=64, timeout=10., topo=solution.diagonal_topology,
+                 engine=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.topo = topo
+        self.engine = engine
+        self.queue = asyncio.Queue(queue_size)
+        self.pool = None
+        # held while a broken pool is replaced, so that only one dispatcher does it
+        self.pool_lock = asyncio.Lock()
+        self.dispatchers = []
+        self.server = None
+        # 'requests', and one count per response status
+        self.counters = Counter()
+
+    def new_pool(self):
+        # forked workers would inherit open client sockets and keep them from closing
+        return ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'))
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.pool = self.new_pool()
+        self.dispatchers = [asyncio.ensure_future(self.dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.pool is not None:
+            # waiting for the workers to exit would hold up the loop
+            await asyncio.get_running_loop().run_in_executor(None, partial(self.pool.shutdown,
+                                                                           cancel_futures=True))
+
+    async def dispatch(self):
+        """
+        Feed queued grids to the pool, one at a time per worker.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            grid, future = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                pool = self.pool
+                try:
+                    work = loop.run_in_executor(pool, solution.solve_timed, grid, self.topo,
+                                                self.engine, self.timeout)
+                except BrokenProcessPool:
+                    # broken before the grid got to it: solve it in a new pool
+                    pool = await self.replace_pool(pool)
+                    work = loop.run_in_executor(pool, solution.solve_timed, grid, self.topo,
+                                                self.engine, self.timeout)
+                try:
+                    result = await work
+                except BrokenProcessPool:
+                    # the grid may have brought the worker down: fail it, but not the
+                    # requests after it
+                    await self.replace_pool(pool)
+                    raise
+                if not future.cancelled():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def replace_pool(self, broken):
+        """
+        Replace the pool broken, unless another dispatcher already did. Returns the
+        current pool.
+        """
+        async with self.pool_lock:
+            if self.pool is broken:
+                self.pool = self.new_pool()
+                await asyncio.get_running_loop().run_in_executor(None, broken.shutdown)
+            return self.pool
+
+    async def solve(self, grid):
+        """
+        Queue a grid and wait for it. Returns (status, JSON-ready dict).
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((grid, future))
+        except asyncio.QueueFull:
+            return 503, {'grid': grid, 'error': 'server busy, try again later'}
+        try:
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return 504, {'grid': grid, 'error': 'timed out after %g seconds' % self.timeout}
+        body = {'grid': grid, 'solution': None, 'seconds': result.seconds, 'error': result.error}
+        if result.values is None:
+            return 504, body
+        if result.values:
+            body['solution'] = ''.join(result.values[s] for s in self.topo.boxes)
+        return (400 if result.error else 200), body
+
+    async def respond(self, method, path, body):
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, dict(self.counters, queued=self.queue.qsize())
+        if path != '/solve':
+            return 404, {'error': 'unknown path %s' % path}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        return await self.solve(body.decode('ascii', 'replace').strip())
+
+    async def handle(self, reader, writer):
+        """
+        Serve one request per connection.
+        """
+        try:
+            try:
+                status, body = await asyncio.wait_for(self.read_request(reader), self.timeout)
+            except asyncio.TimeoutError:
+                status, body = 408, {'error': 'request not received within %g seconds' % self.timeout}
+            except ValueError:
+                # StreamReader.readline() on a line over MAX_LINE bytes
+                status, body = 400, {'error': 'request line or header over %d bytes' % MAX_LINE}
+            if status is None:
+                try:
+                    status, body = await self.respond(*body)
+                except Exception as e:
+                    status, body = 500, {'error': 'solving failed: %s' % (str(e) or type(e).__name__)}
+            self.counters['requests'] += 1
+            self.counters[str(status)] += 1
+            payload = json.dumps(body).encode('utf-8')
+            writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                          'Content-Length: %d\r\nConnection: close\r\n\r\n'
+                          % (status, REASONS[status], len(payload))).encode('ascii') + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        """
+        Read an HTTP request. Returns (None, (method, path, body)), or (status,
+        error body) if the request cannot be served.
+        """
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            return 400, {'error': 'malformed request line'}
+        method, path = request_line[0], request_line[1].split('?', 1)[0]
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    length = int(value)
+                except ValueError:
+                    return 400, {'error': 'bad Content-Length'}
+        if length > MAX_BODY:
+            return 413, {'error': 'request body over %d bytes' % MAX_BODY}
+        body = await reader.readexactly(length) if length > 0 else b''
+        return None, (method, path, body)
+
+
+async def serve(args, topo):
+    server = SolveServer(args.workers, args.queue, args.timeout, topo, args.engine)
+    listener = await server.start(args.host, args.port)
+    print('serving on %s' % ', '.join('%s:%d' % s.getsockname()[:2] for s in listener.sockets),
+          file=sys.stderr)
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve sudoku solutions over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes, one per CPU by default')
+    parser.add_argument('--queue', type=int, default=64, help='grids waiting for a worker at most')
+    parser.add_argument('--timeout', type=float, default=10., help='seconds per request')
+    parser.add_argument('--size', type=int, default=3,
+                        help='square size: 3 for 9x9 (default), 4 for 16x16, 5 for 25x25')
+    parser.add_argument('--classic', action='store_true', help='no diagonal constraints')
+    parser.add_argument('--engine', choices=solution.ENGINES, default='bitmask',
+                        help='solver backend (default: bitmask)')
+    args = parser.parse_args(argv)
+    try:
+        topo = get_topology(args.size, 'classic' if args.classic else 'diagonal')
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(serve(args, topo))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,221 +1,1046 @@
-#! /bin/python
-assignments = []
-
-rows = 'ABCDEFGHI'
-cols = '123456789'
-digits = '123456789'
-
-def cross(a, b):
-    return [s + t for s in a for t in b]
-
-boxes = cross(rows, cols)
-row_units = [cross(r, cols) for r in rows]
-column_units = [cross(rows, c) for c in cols]
-square_units = [cross(rs, cs) for rs in ('ABC', 'DEF', 'GHI') for cs in ('123', '456', '789')]
-unitlist = row_units + column_units + square_units
-units = dict((s, [u for u in unitlist if s in u]) for s in boxes)
-peers = dict((s, set(sum(units[s], [])) - set([s])) for s in boxes)
-# for diagonal sudoku
-diagonal_units =[[r+cols[i] for i, r in enumerate(rows)], [t[0]+t[1] for t in zip(rows, cols[::-1])]]
-[[peers[s].update(set(du)- set([s])) for s in du] for du in diagonal_units]
-
-def display(values):
-    """
-    Display the values as a 2-D grid.
-    Input: The sudoku in dictionary form
-    Output: None
-    """
-    width = 1 + max(len(values[s]) for s in boxes)
-    line = '+'.join(['-' * (width * 3)] * 3)
-    for r in rows:
-        print(''.join(values[r + c].center(width) + ('|' if c in '36' else '')
-                      for c in cols))
-        if r in 'CF': print(line)
-    return
-
-def grid_values(grid):
-    """
-    Convert grid into a dict of {square: char} with '123456789' for empties.
-    Input: A grid in string form.
-    Output: A grid in dictionary form
-            Keys: The boxes, e.g., 'A1'
-            Values: The value in each box, e.g., '8'. If the box has no value, then the value will be '123456789'.
-    """
-    return {boxes[i] : digits if g=='.' or g=='0' else g for i, g in enumerate(grid)}
-
-def assign_value(values, box, value):
-    """
-    Please use this function to update your values dictionary!
-    Assigns a value to a given box. If it updates the board record it.
-    """
-
-    # Don't waste memory appending actions that don't actually change any values
-    if values[box] == value:
-        return values
-
-    values[box] = value
-    if len(value) == 1:
-        assignments.append(values.copy())
-    return values
-
-def remove_twin_values(values, arr, twin_d):
-    unsolved = [k for k in arr if len(values[k]) >2]
-    changed = False
-    for s in unsolved:
-        s_value = set(values[s])
-        s_new_value = s_value - twin_d
-        if s_value != s_new_value:
-            changed= True
-            new_value= "".join(sorted(list(s_new_value)))
-            #print("!!! remove_twin_values removevd: %s: %s => %s, twin=%s" % (s, values[s], new_value, twin_d))
-            values[s] = new_value
-    return values, changed
-
-def naked_twins(values):
-    """Eliminate values using the naked twins strategy.
-    Args:
-        values(dict): a dictionary of the form {'box_name': '123456789', ...}
-
-    Returns:
-        the values dictionary with the naked twins eliminated from peers.
-    """
-    stalled = False
-    while not stalled:
-        two_values = {k: v for k, v in values.items() if len(v) == 2}
-        if two_values and len(two_values) > 1:
-            twins = []
-            c_changed = 0
-            for k, v in two_values.items():
-                if k not in twins:
-                    for p in peers[k]:
-                        if values[p] == v:        # we have twin
-                            changed = False
-                            twins.append(p)       # so do not  process it again
-                            if k[0] == p[0]:      # same rows
-                                values, changed = remove_twin_values(values, row_units[rows.index(k[0])], set(v))
-                            elif k[1] == p[1]:    # dame column
-                                values, changed = remove_twin_values(values, column_units[cols.index(k[1])], set(v))
-                            else:
-                                for sq in square_units:
-                                    if k in sq and p in sq:
-                                        values, changed = remove_twin_values(values, sq, set(v))
-                                        break
-                            if changed:
-                                c_changed += 1
-                            break                 # only one pair
-            stalled = c_changed == 0
-        else:
-            stalled = True
-    return values
-
-def eliminate(values):
-    """
-    Go through all the boxes, and whenever there is a box with a value, eliminate this value from the values of all its peers.
-    Input: A sudoku in dictionary form.
-    Output: The resulting sudoku in dictionary form.
-    """
-    solved_values = [k for k, v in values.items() if len(v) == 1]
-    for box in solved_values:
-        digit = values[box]
-        for peer in peers[box]:
-            values[peer] = values[peer].replace(digit, '')
-    return values
-
-def only_choice(values):
-    """
-    Go through all the units, and whenever there is a unit with a value that only fits in one box, assign the value to this box.
-    Input: A sudoku in dictionary form.
-    Output: The resulting sudoku in dictionary form.
-    """
-    changed = 0
-    for unit in unitlist:
-        for digit in '123456789':
-            dplaces = [box for box in unit if digit in values[box]]
-            if len(dplaces) == 1 and len(values[dplaces[0]]) > 1:
-                values[dplaces[0]] = digit
-                changed += 1
-    return values, changed == 0
-
-def reduce_puzzle(values):
-    """
-    Iterate eliminate() and only_choice(). If at some point, there is a box with no available values, return False.
-    If the sudoku is solved, return the sudoku.
-    If after an iteration of both functions, the sudoku remains the same, return the sudoku.
-    Input: A sudoku in dictionary form.
-    Output: The resulting sudoku in dictionary form.
-    """
-    stalled = False
-    while not stalled:
-        values = naked_twins(values)
-        if all(len(v) == 1 for v in values.values()):
-            break
-        values = eliminate(values)
-        values, stalled = only_choice(values)
-        if '' in values.values():
-            return False
-        if all(len(v) == 1 for v in values.values()):
-            break
-    return values
-
-def search(values):
-    values = reduce_puzzle(values)
-    if not values:
-        return False
-    if all(len(v) == 1 for v in values.values()):
-        return values
-    unsolved = {k: v for k, v in values.items() if len(v) > 1}
-    if unsolved:
-        sorted_unsolved = sorted(unsolved.items(), key=lambda x: len(x[1]))
-        for s, v in sorted_unsolved:
-            for d in v:
-                copy_of_values = values.copy()
-                copy_of_values[s] = d
-                attempt = search(copy_of_values)
-                if attempt:
-                    return attempt
-        print("unsolved=", unsolved)
-
-def solve(grid):
-    """
-    Find the solution to a Sudoku grid.
-    Args:
-        grid(string): a string representing a sudoku grid.
-            Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
-    Returns:
-        The dictionary representation of the final sudoku grid. False if no solution exists.
-    """
-    assert len(grid) == 81
-    values = grid_values(grid)
-    #display(values)
-    values = search(values)
-    return values
-
-if __name__ == '__main__':
-    diag_sudoku_grids = ['000007000090001000000045006000020000036000410500000809000000004000018000081500032']
-    diag_sudoku_grids2 = ['2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3',
-                    '003020600900305001001806400008102900700000008006708200002609500800203009005010300',
-                    '000260701680070090190004500820100040004602900050003028009300074040050036703018000',
-                    '000100702030950000001002003590000301020000070703000098800200100000085060605009000',
-                    '094000130000000000000076002080010000032000000000200060000050400000008007006304008',
-                    '000000000000942080160000029000000008906000001400250000004000000020008090050000700',
-                    '052470000060000000000008010400000009700950000020040030000800090000003706000091000',
-                    '090000000001006000060080070300000010000039000000050002170400028000003000086000057',
-                    '000005000020004010030080020000008400800600000090010705006000000950003060003000001',
-                    '500068000000000060042050000000800900001000040903000620700001009004200003080000000',
-                    '000007000090001000000045006000020000036000410500000809000000004000018000081500032' ]
-
-    for dsg in diag_sudoku_grids:
-        print('sukodu: %s' % dsg)
-        values = solve(dsg)
-        if values:
-            display(values)
-        else:
-            print("Cannot find solution for %s" % dsg)
-        try:
-            from visualize import visualize_assignments
-            visualize_assignments(assignments)
-
-        except SystemExit:
-            pass
-        except:
-            print('We could not visualize your board due to a pygame issue. Not a problem! It is not a requirement.')
+#! /bin/python
+import argparse
+import os
+import sys
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import dlx
+import puzzle_io
+from topology import cross, get_topology
+
+# The dictionary engine below works on the 9 x 9 diagonal board; the bitmask engine
+# takes any topology.get_topology() board, this one by default.
+diagonal_topology = get_topology(3, 'diagonal')
+
+rows = ''.join(diagonal_topology.rows)
+cols = ''.join(diagonal_topology.cols)
+digits = diagonal_topology.digits
+
+boxes = diagonal_topology.boxes
+row_units = diagonal_topology.row_units
+column_units = diagonal_topology.column_units
+square_units = diagonal_topology.square_units
+diagonal_units = diagonal_topology.diagonal_units
+unitlist = row_units + column_units + square_units
+units = diagonal_topology.units
+peers = diagonal_topology.peers
+
+# units propagate() scans for only choices and naked twins, diagonals included
+propagation_units = diagonal_topology.unitlist
+box_units = dict((s, diagonal_topology.box_units[i]) for i, s in enumerate(boxes))
+# box -> ids in unitlist of its row, column and square, for naked_twins(); unitlist
+# starts propagation_units, so these are the ids of box_units below len(unitlist)
+twin_units = dict((s, [u for u in box_units[s] if u < len(unitlist)]) for s in boxes)
+
+# grids used by demo() and benchmark.py; only the first one has a diagonal solution
+sample_grids = ['2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3',
+                '003020600900305001001806400008102900700000008006708200002609500800203009005010300',
+                '000260701680070090190004500820100040004602900050003028009300074040050036703018000',
+                '000100702030950000001002003590000301020000070703000098800200100000085060605009000',
+                '094000130000000000000076002080010000032000000000200060000050400000008007006304008',
+                '000000000000942080160000029000000008906000001400250000004000000020008090050000700',
+                '052470000060000000000008010400000009700950000020040030000800090000003706000091000',
+                '090000000001006000060080070300000010000039000000050002170400028000003000086000057',
+                '000005000020004010030080020000008400800600000090010705006000000950003060003000001',
+                '500068000000000060042050000000800900001000040903000620700001009004200003080000000',
+                '000007000090001000000045006000020000036000410500000809000000004000018000081500032']
+
+def display(values):
+    """
+    Display the values as a 2-D grid.
+    Input: The sudoku in dictionary form
+    Output: None
+    """
+    width = 1 + max(len(values[s]) for s in boxes)
+    line = '+'.join(['-' * (width * 3)] * 3)
+    for r in rows:
+        print(''.join(values[r + c].center(width) + ('|' if c in '36' else '')
+                      for c in cols))
+        if r in 'CF': print(line)
+    return
+
+def grid_values(grid):
+    """
+    Convert grid into a dict of {square: char} with '123456789' for empties.
+    Input: A grid in string form.
+    Output: A grid in dictionary form
+            Keys: The boxes, e.g., 'A1'
+            Values: The value in each box, e.g., '8'. If the box has no value, then the value will be '123456789'.
+    """
+    return {boxes[i] : digits if g=='.' or g=='0' else g for i, g in enumerate(grid)}
+
+def assign_value(values, box, value):
+    """
+    Please use this function to update your values dictionary!
+    Assigns a value to a given box. If values is a RecordingValues the change is recorded.
+    """
+
+    # Don't waste memory recording actions that don't actually change any values
+    if values[box] == value:
+        return values
+
+    values[box] = value
+    return values
+
+class Recorder(object):
+    """
+    Records the changes made to a sudoku during one solve as (box, old, new) steps,
+    keeping at most maxlen of them. When a step falls off the front of the buffer it
+    is applied to the starting board, so replay() still rebuilds every board.
+    """
+    def __init__(self, maxlen=10000):
+        self.start = {}
+        self.steps = deque(maxlen=maxlen)
+
+    def begin(self, values):
+        """Start recording from the board values."""
+        self.start = dict(values)
+        self.steps.clear()
+
+    def record(self, box, old, new):
+        steps = self.steps
+        if len(steps) == steps.maxlen:
+            dropped_box, _, dropped_new = steps[0]
+            self.start[dropped_box] = dropped_new
+        steps.append((box, old, new))
+
+    def replay(self):
+        """
+        Yield ((box, old, new), values) for every recorded step, values being the board
+        right after it. The same dictionary is updated in place, copy it to keep it.
+        """
+        values = dict(self.start)
+        for step in self.steps:
+            values[step[0]] = step[2]
+            yield step, values
+
+def naked_twins(values):
+    """Eliminate values using the naked twins strategy.
+    Args:
+        values(dict): a dictionary of the form {'box_name': '123456789', ...}
+
+    Returns:
+        the values dictionary with the naked twins eliminated from peers.
+    """
+    # (unit id, two-digit value) -> boxes of the unit holding it
+    buckets = {}
+    # buckets that just got their second box, whose unit is left to clean up
+    pending = []
+
+    def add(box):
+        for u in twin_units[box]:
+            twins = buckets.setdefault((u, values[box]), [])
+            twins.append(box)
+            if len(twins) == 2:
+                pending.append((u, values[box]))
+
+    for box, value in values.items():
+        if len(value) == 2:
+            add(box)
+    while pending:
+        u, twin = pending.pop()
+        for box in unitlist[u]:
+            value = values[box]
+            if len(value) > 2 and (twin[0] in value or twin[1] in value):
+                values[box] = value = value.replace(twin[0], '').replace(twin[1], '')
+                if len(value) == 2:
+                    add(box)
+    return values
+
+def eliminate(values):
+    """
+    Go through all the boxes, and whenever there is a box with a value, eliminate this value from the values of all its peers.
+    Input: A sudoku in dictionary form.
+    Output: The resulting sudoku in dictionary form.
+    """
+    solved_values = [k for k, v in values.items() if len(v) == 1]
+    for box in solved_values:
+        digit = values[box]
+        for peer in peers[box]:
+            if digit in values[peer]:
+                values[peer] = values[peer].replace(digit, '')
+    return values
+
+def only_choice(values):
+    """
+    Go through all the units, and whenever there is a unit with a value that only fits in one box, assign the value to this box.
+    Input: A sudoku in dictionary form.
+    Output: The resulting sudoku in dictionary form.
+    """
+    changed = 0
+    for unit in unitlist:
+        unit_values = [values[box] for box in unit]
+        solved = ''.join(v for v in unit_values if len(v) == 1)
+        unsolved = ''.join(v for v in unit_values if len(v) > 1)
+        for digit in '123456789':
+            # a box holds a digit at most once, so one hit means one place
+            if digit not in solved and unsolved.count(digit) == 1:
+                place = next(i for i, v in enumerate(unit_values) if digit in v)
+                values[unit[place]] = unit_values[place] = digit
+                solved += digit
+                unsolved = ''.join(v for v in unit_values if len(v) > 1)
+                changed += 1
+    return values, changed == 0
+
+def propagate(values, changed, unsolved=None, stats=None):
+    """
+    Event-driven eliminate, only choice and naked twins: a box that changed has its
+    digit eliminated from its peers (once solved), and only the units it belongs to
+    are scanned again for only choices and naked twins. Every box changed on the way
+    is queued in turn, until the queue runs dry.
+    Input: A sudoku in dictionary form, the boxes changed since it was last propagated
+           and optionally its number of unsolved boxes, counted when not given.
+           stats, a Counter, gets one 'propagations' per box or unit processed.
+    Output: (values, unsolved), the propagated sudoku and its number of unsolved boxes,
+            kept up to date while propagating. values is False if a box runs out of
+            values or a digit has no place left in a unit.
+    """
+    if unsolved is None:
+        unsolved = sum(len(v) > 1 for v in values.values())
+    pending = list(changed)
+    dirty = {}          # unit id -> None, an insertion-ordered set
+    while pending or dirty:
+        if stats is not None:
+            stats['propagations'] += 1
+        if pending:
+            box = pending.pop()
+            value = values[box]
+            if len(value) == 1:
+                for peer in peers[box]:
+                    peer_value = values[peer]
+                    if value in peer_value:
+                        peer_value = peer_value.replace(value, '')
+                        if not peer_value:
+                            return False, unsolved
+                        values[peer] = peer_value
+                        if len(peer_value) == 1:
+                            unsolved -= 1
+                        pending.append(peer)
+            dirty.update(dict.fromkeys(box_units[box]))
+            continue
+
+        unit = propagation_units[dirty.popitem()[0]]
+        unit_values = [values[b] for b in unit]
+        solved = ''.join(v for v in unit_values if len(v) == 1)
+        open_values = ''.join(v for v in unit_values if len(v) > 1)
+        for digit in digits:
+            if digit in solved:
+                continue
+            count = open_values.count(digit)
+            if not count:
+                return False, unsolved
+            if count == 1:
+                place = next(i for i, v in enumerate(unit_values) if digit in v)
+                values[unit[place]] = unit_values[place] = digit
+                unsolved -= 1
+                pending.append(unit[place])
+                solved += digit
+                open_values = ''.join(v for v in unit_values if len(v) > 1)
+        twins = {}
+        for i, v in enumerate(unit_values):
+            if len(v) != 2:
+                continue
+            if v not in twins:
+                twins[v] = i
+                continue
+            for j, other in enumerate(unit_values):
+                if j != i and j != twins[v] and (v[0] in other or v[1] in other):
+                    other = other.replace(v[0], '').replace(v[1], '')
+                    if not other:
+                        return False, unsolved
+                    values[unit[j]] = unit_values[j] = other
+                    if len(other) == 1:
+                        unsolved -= 1
+                    pending.append(unit[j])
+    return values, unsolved
+
+def reduce_puzzle(values):
+    """
+    Propagate eliminate(), only_choice() and naked_twins() over the whole board until nothing changes.
+    If at some point, there is a box with no available values, return False.
+    Input: A sudoku in dictionary form.
+    Output: The resulting sudoku in dictionary form.
+    """
+    values, unsolved = propagate(values, boxes)
+    return values
+
+class TrailValues(dict):
+    """
+    A sudoku in dictionary form that logs the old value of every box it changes,
+    so a failed search branch can be undone in place instead of working on a copy.
+    """
+    def __init__(self, values):
+        dict.__init__(self, values)
+        self.trail = []
+
+    def __setitem__(self, box, value):
+        self.trail.append((box, self[box]))
+        dict.__setitem__(self, box, value)
+
+    def undo(self, mark):
+        """Restore every box changed since len(self.trail) was mark."""
+        # replayed newest first, so the oldest value of a box changed twice wins
+        dict.update(self, reversed(self.trail[mark:]))
+        del self.trail[mark:]
+
+class RecordingValues(TrailValues):
+    """
+    A TrailValues that also reports every change, undos included, to a Recorder.
+    """
+    def __init__(self, values, recorder):
+        TrailValues.__init__(self, values)
+        self.recorder = recorder
+        recorder.begin(values)
+
+    def __setitem__(self, box, value):
+        self.recorder.record(box, self[box], value)
+        TrailValues.__setitem__(self, box, value)
+
+    def undo(self, mark):
+        trail = self.trail
+        for box, old in reversed(trail[mark:]):
+            self.recorder.record(box, self[box], old)
+            dict.__setitem__(self, box, old)
+        del trail[mark:]
+
+class BudgetExhausted(Exception):
+    """
+    Raised by Budget.check() when a search runs out of time or nodes, or is cancelled.
+    """
+
+class Budget(object):
+    """
+    Limits of one search, for the search functions' budget argument: every search
+    node calls check(), which raises BudgetExhausted once more than max_nodes nodes
+    were searched, the deadline (max_seconds from now) has passed, or cancel() was
+    called, possibly from another thread. Propagation calls check_time() once per
+    pass, so that a long one inside a node stops too. nodes counts the nodes searched
+    so far.
+    """
+    def __init__(self, max_seconds=None, max_nodes=None):
+        self.deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExhausted('searched more than %d nodes' % self.max_nodes)
+        self.check_time()
+
+    def check_time(self):
+        """
+        check() without counting a node: only the deadline and cancel().
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExhausted('deadline passed')
+        if self.cancelled:
+            raise BudgetExhausted('cancelled')
+
+def search_trail(values, changed=boxes, unsolved=None, stats=None, budget=None):
+    """
+    Recursive part of search(), working in place on a TrailValues. Only the boxes in
+    changed need propagating; unsolved is their count of unsolved boxes, if known.
+    """
+    if stats is not None:
+        stats['nodes'] += 1
+    if budget is not None:
+        budget.check()
+    values, unsolved = propagate(values, changed, unsolved, stats)
+    if not values:
+        return False
+    if not unsolved:
+        return values
+    # branch on the first box with the fewest values; if none of them works,
+    # no other box can rescue this board
+    s = min((k for k in boxes if len(values[k]) > 1), key=lambda k: len(values[k]))
+    if stats is not None:
+        stats['branches'] += 1
+    for d in values[s]:
+        mark = len(values.trail)
+        values[s] = d
+        attempt = search_trail(values, [s], unsolved - 1, stats, budget)
+        if attempt:
+            return attempt
+        values.undo(mark)
+        if stats is not None:
+            stats['backtracks'] += 1
+    return False
+
+def search(values, recorder=None, stats=None, budget=None):
+    """
+    Using depth-first search and propagation, try all possible values.
+    Input: A sudoku in dictionary form, left unchanged, optionally a Recorder to
+           record every change made while searching, a Counter to count search
+           'nodes', 'branches', 'backtracks' and 'propagations' in, and a Budget.
+    Output: The solved sudoku in dictionary form, or a false value if there is none.
+    """
+    values = TrailValues(values) if recorder is None else RecordingValues(values, recorder)
+    values = search_trail(values, boxes, None, stats, budget)
+    return dict(values) if values else values
+
+def grid_bits(grid, topo=diagonal_topology):
+    """
+    Convert grid into a flat list of candidate bitmasks, all digits set for empties.
+    Input: A grid in string (or ASCII bytes) form, and the Topology it is laid out in.
+    Output: A list of topo.cells ints, in the order of topo.boxes.
+    """
+    cell_masks = topo.cell_masks
+    return [cell_masks[g] for g in grid]
+
+def values_bits(values, topo=diagonal_topology):
+    """
+    Convert a sudoku in dictionary form into a flat list of candidate bitmasks.
+    """
+    digit_masks = topo.digit_masks
+    return [sum(digit_masks[d] for d in values[s]) for s in topo.boxes]
+
+def bits_values(cells, topo=diagonal_topology):
+    """
+    Convert a flat list of candidate bitmasks back into the dictionary form.
+    """
+    mask_digits = topo.mask_digits
+    return {s: mask_digits[m] for s, m in zip(topo.boxes, cells)}
+
+def eliminate_bits(cells, queue, topo=diagonal_topology, stats=None):
+    """
+    Remove the digit of every solved box in queue from its peers. Boxes that become
+    solved on the way are queued as well, so one call propagates to exhaustion.
+    Input: A list of bitmasks, a list of solved box indices (emptied on return), the
+           board Topology and optionally a Counter for 'eliminate.calls' and
+           'eliminate.removed' (candidates removed).
+    Output: False if a box runs out of candidates, otherwise True.
+    """
+    peer_indices = topo.peer_indices
+    removed = 0
+    try:
+        while queue:
+            i = queue.pop()
+            m = cells[i]
+            for p in peer_indices[i]:
+                c = cells[p]
+                if c & m:
+                    c &= ~m
+                    removed += 1
+                    if not c:
+                        return False
+                    cells[p] = c
+                    if not c & (c - 1):
+                        queue.append(p)
+        return True
+    finally:
+        if stats is not None:
+            stats['eliminate.calls'] += 1
+            stats['eliminate.removed'] += removed
+
+def only_choice_bits(cells, queue, topo=diagonal_topology, stats=None):
+    """
+    Whenever a digit fits in only one box of a unit, assign it there.
+    Newly solved boxes are appended to queue. stats, if given, gets 'only_choice.calls'
+    and 'only_choice.assigned'.
+    Output: False if a unit cannot hold some digit, otherwise True.
+    """
+    all_digits = topo.all_digits
+    assigned = 0
+    try:
+        for unit in topo.unit_indices:
+            once = twice = 0
+            for i in unit:
+                c = cells[i]
+                twice |= once & c
+                once |= c
+            if once != all_digits:
+                return False
+            unique = once & ~twice
+            if unique:
+                for i in unit:
+                    c = cells[i]
+                    u = c & unique
+                    if u and u != c:
+                        if u & (u - 1):
+                            return False
+                        cells[i] = u
+                        queue.append(i)
+                        assigned += 1
+        return True
+    finally:
+        if stats is not None:
+            stats['only_choice.calls'] += 1
+            stats['only_choice.assigned'] += assigned
+
+def naked_twins_bits(cells, queue, topo=diagonal_topology, stats=None):
+    """
+    Whenever two boxes of a unit share the same two candidates, remove those
+    candidates from the rest of the unit. Newly solved boxes are appended to queue.
+    stats, if given, gets 'naked_twins.calls', 'naked_twins.found' and
+    'naked_twins.removed' (candidates removed).
+    Output: False if a box runs out of candidates, otherwise True.
+    """
+    pair_masks = topo.pair_masks
+    found = removed = 0
+    try:
+        for unit in topo.unit_indices:
+            pairs = {}
+            for i in unit:
+                c = cells[i]
+                if c in pair_masks:
+                    if c in pairs:
+                        found += 1
+                        twin = pairs[c]
+                        for j in unit:
+                            o = cells[j]
+                            if j != i and j != twin and o & c:
+                                removed += 1 if o & c != c else 2
+                                o &= ~c
+                                if not o:
+                                    return False
+                                cells[j] = o
+                                if not o & (o - 1):
+                                    queue.append(j)
+                    else:
+                        pairs[c] = i
+        return True
+    finally:
+        if stats is not None:
+            stats['naked_twins.calls'] += 1
+            stats['naked_twins.found'] += found
+            stats['naked_twins.removed'] += removed
+
+# largest naked or hidden subset subsets_bits() looks for; with 9 boxes to a unit,
+# naked and hidden subsets up to quads between them cover every subset of a unit
+SUBSET_SIZE = 4
+
+def find_subsets(masks, popcount, limit=SUBSET_SIZE):
+    """
+    Find the subsets of masks, of at most limit members, whose union has as many bits
+    as the subset has members. With masks the candidates of the open boxes of a unit
+    these are its naked subsets; with masks the open boxes each digit can go in,
+    indexed by position in the unit, its hidden subsets.
+    Output: A list of (members, union), members a bitmask of indices into masks.
+            A subset found is not grown any further, so of two subsets of the same
+            union only the first is listed, and contradictions (more members than
+            bits) go unnoticed; removing the union from the other boxes shows them.
+    """
+    found = []
+    # masks with more bits than limit take part in no subset
+    small = [j for j, m in enumerate(masks) if popcount[m] <= limit]
+    if len(small) < 2:
+        return found
+
+    def extend(start, members, union, size):
+        for k in range(start, len(small)):
+            j = small[k]
+            u = union | masks[j]
+            bits = popcount[u]
+            if bits == size + 1:
+                found.append((members | 1 << j, u))
+            elif bits <= limit:
+                extend(k + 1, members | 1 << j, u, size + 1)
+
+    extend(0, 0, 0, 0)
+    return found
+
+def subsets_bits(cells, queue, topo=diagonal_topology, stats=None, limit=SUBSET_SIZE):
+    """
+    Naked and hidden pairs, triples and quads, or subsets of up to limit members.
+    Whenever k boxes of a unit hold only k candidates between them, remove those
+    candidates from the rest of the unit; whenever k digits of a unit fit only in k
+    of its boxes, remove every other candidate from those boxes. Only boxes with at
+    most k candidates, and digits with at most k places (counted for all digits at
+    once), are combined, so the cost follows the few that can take part.
+    Newly solved boxes are appended to queue, and the call returns as soon as there
+    are some, for eliminate to run first. stats, if given, gets 'subsets.calls',
+    'subsets.found' and 'subsets.removed' (candidates removed).
+    Output: False if a contradiction turns up, otherwise True.
+    """
+    popcount = topo.popcount
+    found = removed = 0
+    try:
+        for unit in topo.unit_indices:
+            open_boxes = [i for i in unit if cells[i] & (cells[i] - 1)]
+            n = len(open_boxes)
+            if n < 4:
+                continue
+            # k digits held to k boxes leave the other n - k digits to the other
+            # n - k boxes, so a hidden subset is the naked subset of the boxes left,
+            # and looking for each up to half the open boxes finds them all
+            naked = find_subsets([cells[i] for i in open_boxes], popcount, min(limit, n // 2))
+            for members, union in naked:
+                found += 1
+                for k, i in enumerate(open_boxes):
+                    c = cells[i]
+                    if not members >> k & 1 and c & union:
+                        removed += popcount[c & union]
+                        c &= ~union
+                        if not c:
+                            return False
+                        cells[i] = c
+                        if not c & (c - 1):
+                            queue.append(i)
+            if queue:
+                # a box got solved: its digit is still a candidate of its peers
+                # until eliminate runs, which would throw the positions off
+                return True
+            if n < 5:
+                continue
+            # only digits that fit in at most size boxes can make a hidden subset:
+            # count up to size + 1 for every digit at once, seen[j] holding the
+            # digits found in more than j boxes
+            size = min(limit, (n - 1) // 2)
+            masks = [cells[i] for i in open_boxes]
+            seen = [0] * (size + 1)
+            for c in masks:
+                for j in range(size, 0, -1):
+                    seen[j] |= seen[j - 1] & c
+                seen[0] |= c
+            few = seen[0] & ~seen[size]
+            if not few & (few - 1):
+                continue
+            digit_bits = []
+            positions = []
+            while few:
+                d = few & -few
+                few ^= d
+                digit_bits.append(d)
+                positions.append(sum(1 << k for k, c in enumerate(masks) if c & d))
+            hidden = find_subsets(positions, popcount, size)
+            for members, where in hidden:
+                found += 1
+                keep = 0
+                for k, d in enumerate(digit_bits):
+                    if members >> k & 1:
+                        keep |= d
+                for k, i in enumerate(open_boxes):
+                    c = cells[i]
+                    if where >> k & 1 and c & ~keep:
+                        removed += popcount[c & ~keep]
+                        c &= keep
+                        if not c:
+                            return False
+                        cells[i] = c
+                        if not c & (c - 1):
+                            queue.append(i)
+            if queue:
+                return True
+        return True
+    finally:
+        if stats is not None:
+            stats['subsets.calls'] += 1
+            stats['subsets.found'] += found
+            stats['subsets.removed'] += removed
+
+def reduce_bits(cells, queue=None, topo=diagonal_topology, stats=None, subsets=False, budget=None):
+    """
+    Bitmask counterpart of reduce_puzzle(): iterate eliminate, only choice and naked
+    twins in place until nothing changes.
+    Input: A list of bitmasks, optionally the indices of the boxes solved since the
+           last reduction (defaults to every solved box), and the board Topology.
+           stats, a Counter, switches on counting: one 'propagations' per pass of the
+           three rules, their own counters and their time in '<rule>.seconds'.
+           subsets, if true, runs subsets_bits() whenever the three rules stall, and
+           carries on while it finds something. budget, a Budget, has its
+           check_time() called before every pass.
+    Output: False if the board has a contradiction, otherwise True.
+    """
+    if queue is None:
+        queue = [i for i, c in enumerate(cells) if c and not c & (c - 1)]
+    if stats is not None:
+        return reduce_bits_counted(cells, queue, topo, stats, subsets, budget)
+    while True:
+        if budget is not None:
+            budget.check_time()
+        if not eliminate_bits(cells, queue, topo):
+            return False
+        before = cells[:]
+        if not only_choice_bits(cells, queue, topo) or not naked_twins_bits(cells, queue, topo):
+            return False
+        if not queue and cells == before:
+            if not subsets:
+                return True
+            if not subsets_bits(cells, queue, topo):
+                return False
+            if not queue and cells == before:
+                return True
+
+def reduce_bits_counted(cells, queue, topo, stats, subsets=False, budget=None):
+    """
+    reduce_bits() with counting switched on, kept apart so the plain loop pays nothing.
+    """
+    clock = time.perf_counter
+    while True:
+        if budget is not None:
+            budget.check_time()
+        stats['propagations'] += 1
+        start = clock()
+        ok = eliminate_bits(cells, queue, topo, stats)
+        now = clock()
+        stats['eliminate.seconds'] += now - start
+        if not ok:
+            return False
+        before = cells[:]
+        ok = only_choice_bits(cells, queue, topo, stats)
+        start, now = now, clock()
+        stats['only_choice.seconds'] += now - start
+        if not ok:
+            return False
+        ok = naked_twins_bits(cells, queue, topo, stats)
+        start, now = now, clock()
+        stats['naked_twins.seconds'] += now - start
+        if not ok:
+            return False
+        if not queue and cells == before:
+            if not subsets:
+                return True
+            ok = subsets_bits(cells, queue, topo, stats)
+            stats['subsets.seconds'] += clock() - now
+            if not ok:
+                return False
+            if not queue and cells == before:
+                return True
+
+def search_bits(cells, queue=None, topo=diagonal_topology, stats=None, budget=None, subsets=False):
+    """
+    Bitmask counterpart of search(): reduce, then branch on the unsolved box with
+    the fewest candidates, trying digits in ascending order.
+    Input: A list of bitmasks, the board Topology, and optionally a Counter to count
+           search 'nodes', 'branches' (nodes that had to guess), 'backtracks' (guesses
+           that failed) and everything reduce_bits() counts, and a Budget to check at
+           every node and every propagation pass. subsets switches on subsets_bits(), see reduce_bits().
+    Output: The solved list of bitmasks, or False if no solution exists.
+    """
+    return next(solutions_bits(cells, queue, topo, stats, budget, subsets), False)
+
+def solutions_bits(cells, queue=None, topo=diagonal_topology, stats=None, budget=None, subsets=False):
+    """
+    Generator form of search_bits(), which takes its first solution: yield every
+    solution as a list of bitmasks, digits tried in ascending order. Stopping early
+    costs nothing, the search only goes as far as the solutions asked for.
+    """
+    if stats is not None:
+        stats['nodes'] += 1
+    if budget is not None:
+        budget.check()
+    if not reduce_bits(cells, queue, topo, stats, subsets, budget):
+        return
+    popcount = topo.popcount
+    best, best_count = -1, len(topo.digits) + 1
+    for i, c in enumerate(cells):
+        n = popcount[c]
+        if 1 < n < best_count:
+            best, best_count = i, n
+            if n == 2:
+                break
+    if best < 0:
+        yield cells
+        return
+    if stats is not None:
+        stats['branches'] += 1
+    c = cells[best]
+    while c:
+        bit = c & -c
+        c ^= bit
+        attempt = cells[:]
+        attempt[best] = bit
+        found = False
+        for solved in solutions_bits(attempt, [best], topo, stats, budget, subsets):
+            found = True
+            yield solved
+        if not found and stats is not None:
+            stats['backtracks'] += 1
+
+def count_solutions(grid, limit=None, topo=diagonal_topology, stats=None, engine=None, budget=None):
+    """
+    Count the solutions of a Sudoku grid, searching no further than needed.
+    Args:
+        grid(string): a grid in the form solve() takes.
+        limit(int): stop once this many solutions are found, so limit=2 tells a
+            proper puzzle (1) from one with no (0) or several (2) solutions.
+            None counts them all, which can take very long on a sparse grid.
+        topo(Topology): the board size and variant.
+        stats(Counter): gets the search counters, as in solve().
+        engine(str): 'bitmask' (default), 'subsets' or 'dlx'.
+        budget(Budget): limits of the search, see solve().
+    Returns:
+        The number of solutions, at most limit.
+    """
+    if len(grid) != topo.cells:
+        raise ValueError('grid must have %d cells' % topo.cells)
+    if engine is None:
+        engine = 'bitmask'
+    cells = grid_bits(grid, topo)
+    if engine == 'dlx':
+        found = dlx.exact_cover(topo).solutions(cells, stats, budget)
+    elif engine in ('bitmask', 'subsets'):
+        found = solutions_bits(cells, None, topo, stats, budget, engine == 'subsets')
+    else:
+        raise ValueError('cannot count solutions with engine %r, expected bitmask, subsets or dlx' % engine)
+    return sum(1 for _ in islice(found, limit))
+
+# solver backends solve() can run, see its engine argument; 'subsets' searches fewer
+# nodes but is slower than 'bitmask', and not meant as a default
+ENGINES = ('bitmask', 'subsets', 'dict', 'dlx')
+
+def solve(grid, recorder=None, topo=diagonal_topology, stats=None, engine=None, budget=None):
+    """
+    Find the solution to a Sudoku grid.
+    Args:
+        grid(string): a string representing a sudoku grid.
+            Example: '2.............62....1....7...6..8...3...9...7...6..4...4....8....52.............3'
+        recorder(Recorder): record the solve into it, for visualize_assignments().
+            Only the dictionary engine records.
+        topo(Topology): the board size and variant, see topology.get_topology().
+            The 9 x 9 diagonal board by default; the dictionary engine only works with that one.
+        stats(Counter): if given, the solve is counted in it: search 'nodes', 'branches'
+            and 'backtracks', calls and removals of each rule, time spent in each rule
+            and in the whole solve ('solve.seconds'), see search_bits(). Leaving it
+            out costs nothing.
+        engine(str): the backend, one of ENGINES: 'bitmask', constraint propagation
+            and search on bitmasks; 'subsets', the same with naked and hidden subsets
+            up to quads (see subsets_bits()), fewer nodes for more work per node,
+            slower overall;
+            'dict', the same as 'bitmask' on the dictionary form; 'dlx',
+            dancing links, slower on easy grids but steadier on hard ones, see dlx.
+            'dict' when recording, 'bitmask' otherwise, by default.
+        budget(Budget): if given, limits the search; BudgetExhausted is raised when it
+            runs out. See solve_bounded() for a result instead of an exception.
+    Returns:
+        The dictionary representation of the final sudoku grid. False if no solution exists.
+    """
+    if len(grid) != topo.cells:
+        raise ValueError('grid must have %d cells' % topo.cells)
+    if engine is None:
+        engine = 'bitmask' if recorder is None else 'dict'
+    if engine not in ENGINES:
+        raise ValueError('unknown engine %r, expected one of %s' % (engine, ', '.join(ENGINES)))
+    if recorder is not None and engine != 'dict':
+        raise ValueError('only the dict engine can record')
+    if engine == 'dict':
+        assert (topo.size, topo.variant) == (3, 'diagonal'), 'the dict engine needs the 9 x 9 diagonal board'
+    if stats is not None:
+        start = time.perf_counter()
+    try:
+        if engine == 'dict':
+            return search(grid_values(grid), recorder, stats, budget) or False
+        cells = grid_bits(grid, topo)
+        if engine == 'dlx':
+            cells = dlx.search_dlx(cells, topo, stats, budget)
+        else:
+            cells = search_bits(cells, None, topo, stats, budget, engine == 'subsets')
+        return bits_values(cells, topo) if cells else False
+    finally:
+        # counted when the budget runs out too, for solve_bounded()'s partial stats
+        if stats is not None:
+            stats['solve.seconds'] += time.perf_counter() - start
+
+# outcomes of solve_bounded()
+SOLVED, UNSOLVABLE, EXHAUSTED = 'solved', 'unsolvable', 'budget exhausted'
+# values is None unless solved; stats holds the search counters, see solve(), as far
+# as the search got
+BoundedResult = namedtuple('BoundedResult', 'status values stats')
+
+def solve_bounded(grid, max_seconds=None, max_nodes=None, topo=diagonal_topology, engine=None,
+                  budget=None):
+    """
+    Solve a grid within a time or node budget, for grids that cannot be trusted.
+    Args:
+        grid(string): a grid in the form solve() takes.
+        max_seconds(float): give up once the search has run this long.
+        max_nodes(int): give up after searching this many nodes.
+        topo(Topology), engine(str): as in solve().
+        budget(Budget): used instead of max_seconds and max_nodes if given, so that
+            another thread can cancel() it.
+    Returns:
+        A BoundedResult whose status is SOLVED, UNSOLVABLE or EXHAUSTED.
+    """
+    if budget is None:
+        budget = Budget(max_seconds, max_nodes)
+    stats = Counter()
+    try:
+        values = solve(grid, topo=topo, stats=stats, engine=engine, budget=budget)
+    except BudgetExhausted:
+        return BoundedResult(EXHAUSTED, None, stats)
+    if values:
+        return BoundedResult(SOLVED, values, stats)
+    return BoundedResult(UNSOLVABLE, None, stats)
+
+# one entry per grid handed to solve_many(); values is False when the grid has no
+# solution and None when its search ran out of budget, error holds the exception
+# message when solving raised
+SolveResult = namedtuple('SolveResult', 'grid values seconds error')
+
+def solve_timed(grid, topo=diagonal_topology, engine=None, max_seconds=None, max_nodes=None):
+    """
+    Solve one grid and wrap the outcome in a SolveResult instead of raising.
+    """
+    start = time.perf_counter()
+    budget = None
+    if max_seconds is not None or max_nodes is not None:
+        budget = Budget(max_seconds, max_nodes)
+    try:
+        values, error = solve(grid, topo=topo, engine=engine, budget=budget), None
+    except BudgetExhausted as e:
+        values, error = None, 'search budget exhausted: %s' % e
+    except Exception as e:
+        values, error = False, '%s: %s' % (type(e).__name__, e)
+    return SolveResult(grid, values, time.perf_counter() - start, error)
+
+def solve_chunk(grids, topo=diagonal_topology, engine=None, vectorized=False, max_seconds=None,
+                max_nodes=None):
+    if vectorized:
+        import batch
+        start = time.perf_counter()
+        try:
+            solved = batch.solve_batch(grids, topo, search=False)
+        except ValueError:
+            pass    # a malformed grid: solve them one at a time to tell which
+        else:
+            seconds = (time.perf_counter() - start) / len(grids)
+            # grids propagation did not solve are searched one at a time, within budget
+            return [solve_timed(grid, topo, engine, max_seconds, max_nodes) if values is None
+                    else SolveResult(grid, values, seconds, None) for grid, values in zip(grids, solved)]
+    return [solve_timed(grid, topo, engine, max_seconds, max_nodes) for grid in grids]
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    chunk = list(islice(it, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(it, size))
+
+def solve_many(grids, workers=None, chunksize=64, topo=diagonal_topology, engine=None,
+               vectorized=False, max_seconds=None, max_nodes=None):
+    """
+    Solve many grids, fanning the work out to a pool of processes.
+    Args:
+        grids: any iterable of grid strings; it is consumed lazily, at most two
+            chunks per worker are in flight, so a generator over a huge file is fine.
+        workers(int): number of processes, os.cpu_count() by default. With 1 (or 0)
+            everything runs in the calling process.
+        chunksize(int): number of grids sent to a worker at a time.
+        topo(Topology): the board size and variant of every grid.
+        engine(str): the solve() backend.
+        vectorized(bool): propagate each chunk as a whole with batch.solve_batch(),
+            which needs NumPy. Faster on easy grids; for the grids propagation solves,
+            seconds is the average over the chunk.
+        max_seconds(float), max_nodes(int): budget of each grid's search, see
+            solve_bounded(); grids that exceed it get None values and an error.
+    Returns:
+        A generator of SolveResult, in the same order as grids.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        if vectorized:
+            for chunk in chunked(grids, chunksize):
+                yield from solve_chunk(chunk, topo, engine, vectorized, max_seconds, max_nodes)
+            return
+        for grid in grids:
+            yield solve_timed(grid, topo, engine, max_seconds, max_nodes)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunked(grids, chunksize):
+            pending.append(pool.submit(solve_chunk, chunk, topo, engine, vectorized, max_seconds,
+                                       max_nodes))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def main(argv=None):
+    """
+    Command-line entry point: solve every puzzle of a file (or stdin) and write one
+    solved line per puzzle as soon as it is available. Puzzles without a
+    solution, malformed or over budget get an empty line, and a note on stderr, so
+    output lines stay aligned with the input. Without an input file the built-in samples are solved and displayed.
+    """
+    parser = argparse.ArgumentParser(description='Solve sudoku puzzles, one per line.')
+    parser.add_argument('input', nargs='?', help="puzzle file, '-' for stdin")
+    parser.add_argument('-o', '--output', help='write solutions to this file instead of stdout')
+    parser.add_argument('-b', '--binary', action='store_true',
+                        help='input holds packed %d-byte records (see puzzle_io)' % puzzle_io.RECORD_SIZE)
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes, one per CPU by default')
+    parser.add_argument('--chunksize', type=int, default=64, help='grids sent to a worker at a time')
+    parser.add_argument('--size', type=int, default=3,
+                        help='square size: 3 for 9x9 (default), 4 for 16x16, 5 for 25x25')
+    parser.add_argument('--classic', action='store_true', help='no diagonal constraints')
+    parser.add_argument('--engine', choices=ENGINES, default='bitmask',
+                        help='solver backend (default: bitmask)')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='propagate whole chunks at once with NumPy, for files of easy grids')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='give up on a puzzle whose search takes longer than this')
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help='give up on a puzzle whose search needs more nodes than this')
+    args = parser.parse_args(argv)
+    try:
+        topo = get_topology(args.size, 'classic' if args.classic else 'diagonal')
+    except ValueError as e:
+        parser.error(str(e))
+    if args.binary and topo.cells != puzzle_io.GRID_SIZE:
+        parser.error('the binary form only holds 9x9 grids')
+    if args.vectorized:
+        try:
+            import batch
+            batch.get_tables(topo)
+        except ImportError:
+            parser.error('--vectorized needs NumPy')
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.input is None:
+        demo()
+        return 0
+
+    grids = puzzle_io.read_grids(args.input, args.binary)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    failed = 0
+    try:
+        for n, result in enumerate(solve_many(grids, args.workers, args.chunksize, topo, args.engine,
+                                                  args.vectorized, args.max_seconds, args.max_nodes), 1):
+            if result.values:
+                out.write(''.join(result.values[s] for s in topo.boxes).encode('ascii'))
+            else:
+                failed += 1
+                print('puzzle %d: %s' % (n, result.error or 'no solution'), file=sys.stderr)
+            out.write(b'\n')
+    finally:
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+    return 1 if failed else 0
+
+def demo():
+    """
+    Solve, display and visualize the sample grids.
+    """
+    diag_sudoku_grids = sample_grids[-1:]
+
+    for dsg in diag_sudoku_grids:
+        print('sukodu: %s' % dsg)
+        assignments = Recorder()
+        values = solve(dsg, assignments)
+        if values:
+            display(values)
+        else:
+            print("Cannot find solution for %s" % dsg)
+        try:
+            from visualize import visualize_assignments
+            visualize_assignments(assignments)
+
+        except SystemExit:
+            pass
+        except:
+            print('We could not visualize your board due to a pygame issue. Not a problem! It is not a requirement.')
+
+if __name__ == '__main__':
+    sys.exit(main())
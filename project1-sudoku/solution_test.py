@@ -1,7 +1,36 @@
 import sys, os, os.path
 sys.path.append(os.path.dirname(__file__))
 import solution
+import benchmark
+import canonical
+import dlx
+import generator
+import puzzle_io
+import server
+import topology
+import asyncio
+import json
+import signal
+import tempfile
 import unittest
+from collections import Counter
+from unittest import mock
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import batch
+except ImportError:
+    batch = None
+try:
+    import pygame
+    import PySudoku
+    import visualize
+except ImportError:
+    pygame = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 
 class TestNakedTwins(unittest.TestCase):
@@ -96,5 +125,602 @@ class TestDiagonalSudoku(unittest.TestCase):
     def test_solve(self):
         self.assertEqual(solution.solve(self.diagonal_grid), self.solved_diag_sudoku)
 
+class TestPropagate(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def test_counts_unsolved(self):
+        values = solution.grid_values(self.diagonal_grid)
+        reduced, unsolved = solution.propagate(dict(values), solution.boxes)
+        self.assertEqual(unsolved, sum(len(v) > 1 for v in reduced.values()))
+        self.assertLess(unsolved, sum(len(v) > 1 for v in values.values()))
+
+    def test_only_changed_boxes(self):
+        values = solution.search(solution.grid_values(self.diagonal_grid))
+        values['A1'] = solution.digits
+        reduced, unsolved = solution.propagate(values, ['A1'], 1)
+        self.assertEqual((reduced, unsolved), (TestDiagonalSudoku.solved_diag_sudoku, 0))
+
+    def test_diagonal_clash(self):
+        values = solution.grid_values('1' + '.' * 39 + '1' + '.' * 40)
+        self.assertFalse(solution.reduce_puzzle(values))
+        self.assertFalse(solution.search(solution.grid_values('1' + '.' * 39 + '1' + '.' * 40)))
+
+
+class TestBitmaskEngine(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def test_round_trip(self):
+        values = solution.grid_values(self.diagonal_grid)
+        cells = solution.values_bits(values)
+        self.assertEqual(cells, solution.grid_bits(self.diagonal_grid))
+        self.assertEqual(solution.bits_values(cells), values)
+
+    def test_matches_dict_search(self):
+        values = solution.search(solution.grid_values(self.diagonal_grid))
+        self.assertEqual(solution.solve(self.diagonal_grid), values)
+
+    def test_no_solution(self):
+        # A1 and E5 share no row, column or square, only the main diagonal
+        grid = '1' + '.' * 39 + '1' + '.' * 40
+        self.assertFalse(solution.solve(grid))
+
+
+class TestSubsets(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def row_a(self, masks):
+        cells = solution.grid_bits('.' * 81)
+        cells[:9] = masks
+        return cells
+
+    def test_find_subsets(self):
+        popcount = solution.diagonal_topology.popcount
+        self.assertIn((0b111, 0b111), solution.find_subsets([0b11, 0b110, 0b101, 0b1111], popcount, 3))
+        self.assertEqual(solution.find_subsets([0b11, 0b1100, 0b111111], popcount, 2), [])
+
+    def test_contradiction(self):
+        # three boxes with two candidates between them
+        cells = self.row_a([0b11, 0b11, 0b11] + [0b111111100] * 6)
+        self.assertFalse(solution.subsets_bits(cells, []))
+
+    def test_naked_triple(self):
+        cells = self.row_a([0b11, 0b110, 0b101] + [0b111111111] * 6)
+        stats = Counter()
+        self.assertTrue(solution.subsets_bits(cells, [], stats=stats))
+        # gone from the rest of row A and of the top left square
+        self.assertEqual(cells[3:9], [0b111111000] * 6)
+        self.assertEqual(cells[9], 0b111111000)
+        self.assertEqual(cells[:3], [0b11, 0b110, 0b101])
+        self.assertGreaterEqual(stats['subsets.found'], 2)
+
+    def test_hidden_pair(self):
+        # 1 and 2 only fit in A1 and A2
+        cells = self.row_a([0b1111, 0b110011] + [0b111111100] * 7)
+        stats = Counter()
+        self.assertTrue(solution.subsets_bits(cells, [], stats=stats))
+        self.assertEqual(cells[:2], [0b11, 0b11])
+        # then a naked pair of the top left square
+        self.assertEqual(cells[9], 0b111111100)
+        self.assertEqual(stats['subsets.removed'], 4 + 6 * 2)
+
+    def test_same_solutions(self):
+        for grid in solution.sample_grids + ['1' + '.' * 39 + '1' + '.' * 40]:
+            self.assertEqual(solution.solve(grid, engine='subsets'), solution.solve(grid))
+        grid = '.' * 40 + '1' + '.' * 40
+        self.assertEqual(solution.count_solutions(grid, 3, engine='subsets'), 3)
+
+    def test_fewer_nodes(self):
+        # stronger propagation can still branch differently and search more nodes on a
+        # grid, so only the corpus total is compared
+        rng = generator.random.Random(4)
+        plain, strong = Counter(), Counter()
+        for _ in range(8):
+            grid = generator.reduce_clues(rng, generator.random_board(rng))
+            self.assertEqual(solution.solve(grid, stats=strong, engine='subsets'),
+                             solution.solve(grid, stats=plain))
+        self.assertLessEqual(strong['nodes'], plain['nodes'])
+
+
+class TestCounters(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def test_counts(self):
+        stats = Counter()
+        self.assertTrue(solution.solve(self.diagonal_grid, stats=stats))
+        # every node but the first is a guess made at a branch point
+        self.assertLessEqual(stats['nodes'], stats['branches'] + stats['backtracks'] + 1)
+        self.assertGreater(stats['nodes'], stats['backtracks'])
+        for rule in ('eliminate', 'only_choice', 'naked_twins'):
+            self.assertGreaterEqual(stats[rule + '.calls'], 1)
+            self.assertGreaterEqual(stats[rule + '.seconds'], 0)
+        self.assertGreater(stats['eliminate.removed'], 0)
+        self.assertGreaterEqual(stats['solve.seconds'], stats['eliminate.seconds'])
+
+    def test_backtracks(self):
+        stats = Counter()
+        self.assertFalse(solution.solve('1' + '.' * 39 + '1' + '.' * 40, stats=stats))
+        self.assertEqual(stats['nodes'], 1)
+        self.assertEqual(stats['branches'], 0)
+        stats = Counter()
+        self.assertTrue(solution.search(solution.grid_values('.' * 81), stats=stats))
+        self.assertGreater(stats['branches'], 0)
+        self.assertLessEqual(stats['nodes'], stats['branches'] + stats['backtracks'] + 1)
+
+    def test_same_result(self):
+        self.assertEqual(solution.solve(self.diagonal_grid, stats=Counter()),
+                         solution.solve(self.diagonal_grid))
+
+
+class TestRecorder(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def replay(self, recorder):
+        values = dict(recorder.start)
+        for (box, old, new), values in recorder.replay():
+            pass
+        return values
+
+    def test_replay(self):
+        recorder = solution.Recorder()
+        values = solution.solve(self.diagonal_grid, recorder)
+        self.assertEqual(values, TestDiagonalSudoku.solved_diag_sudoku)
+        self.assertEqual(recorder.start, solution.grid_values(self.diagonal_grid))
+        self.assertEqual(self.replay(recorder), values)
+
+    def test_bounded(self):
+        recorder = solution.Recorder(maxlen=10)
+        values = solution.solve(self.diagonal_grid, recorder)
+        self.assertEqual(len(recorder.steps), 10)
+        self.assertEqual(self.replay(recorder), values)
+
+    def test_off_by_default(self):
+        values = solution.grid_values(self.diagonal_grid)
+        self.assertIs(solution.assign_value(values, 'A2', '6'), values)
+        self.assertEqual(values['A2'], '6')
+
+
+@unittest.skipIf(pygame is None, 'pygame is not installed')
+class TestRendering(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def setUp(self):
+        pygame.font.init()
+        self.renderer = PySudoku.BoardRenderer(pygame.Surface(PySudoku.size))
+
+    def test_redraws_changes_only(self):
+        values = solution.grid_values(self.diagonal_grid)
+        self.assertEqual(self.renderer.draw(values), [self.renderer.surface.get_rect()])
+        self.assertEqual(self.renderer.draw(values), [])
+        values['A2'] = '6'
+        values['A3'] = '13'    # still blank
+        self.assertEqual(self.renderer.draw(values), [self.renderer.rects['A2']])
+        # one cached tile per kind of square shown
+        self.assertEqual(set(self.renderer.tiles), set(self.renderer.shown.values()))
+
+    def test_render_offscreen(self):
+        recorder = solution.Recorder()
+        solution.solve(self.diagonal_grid, recorder)
+        with tempfile.TemporaryDirectory() as d:
+            count = visualize.visualize_assignments(recorder, os.path.join(d, '%04d.bmp'))
+            self.assertEqual(sorted(os.listdir(d)), ['%04d.bmp' % i for i in range(count)])
+        # frames only where a box gets solved or unsolved, at most one per step
+        self.assertGreater(count, 1)
+        self.assertLessEqual(count, len(recorder.steps) + 1)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_render_gif(self):
+        recorder = solution.Recorder()
+        solution.solve(self.diagonal_grid, recorder)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'trace.gif')
+            every = visualize.visualize_assignments(recorder, path)
+            with mock.patch.object(PySudoku, 'MAX_GIF_FRAMES', 4):
+                count = visualize.visualize_assignments(recorder, path)
+            self.assertGreater(every, 4)
+            self.assertLessEqual(count, 4)
+            with Image.open(path) as gif:
+                self.assertEqual(gif.n_frames, count)
+                gif.seek(count - 1)
+                last = gif.convert('RGB')
+        self.renderer.draw(TestDiagonalSudoku.solved_diag_sudoku)
+        solved = Image.frombytes('RGB', PySudoku.size, pygame.image.tobytes(self.renderer.surface, 'RGB'))
+        self.assertEqual(last.tobytes(), solved.quantize().convert('RGB').tobytes())
+
+
+class TestTopology(unittest.TestCase):
+    classic_grid = '003020600900305001001806400008102900700000008006708200002609500800203009005010300'
+
+    def assertSolved(self, values, topo, grid):
+        for unit in topo.unitlist:
+            self.assertEqual(sorted(values[s] for s in unit), sorted(topo.digits))
+        for s, g in zip(topo.boxes, grid):
+            if g not in '.0':
+                self.assertEqual(values[s], g)
+
+    def test_cached(self):
+        self.assertIs(topology.get_topology(), solution.diagonal_topology)
+        self.assertIs(topology.get_topology(4, 'classic'), topology.get_topology(4, 'classic'))
+        self.assertRaises(ValueError, topology.get_topology, 3, 'samurai')
+
+    def test_default_matches_module(self):
+        topo = topology.get_topology(3, 'diagonal')
+        self.assertEqual(topo.boxes, solution.boxes)
+        self.assertEqual(topo.unitlist, solution.unitlist + solution.diagonal_units)
+
+    def test_classic(self):
+        topo = topology.get_topology(3, 'classic')
+        self.assertFalse(solution.solve(self.classic_grid))
+        self.assertSolved(solution.solve(self.classic_grid, topo=topo), topo, self.classic_grid)
+        self.assertRaises(ValueError, solution.solve, self.classic_grid, topo=topology.get_topology(4, 'classic'))
+
+    def test_16x16(self):
+        topo = topology.get_topology(4, 'diagonal')
+        grid = '1' + '.' * 16 + 'G' + '.' * 238
+        self.assertSolved(solution.solve(grid, topo=topo), topo, grid)
+
+
+class TestBudget(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+    big_grid = '.' * 625
+
+    def test_outcomes(self):
+        result = solution.solve_bounded(self.diagonal_grid, max_nodes=1000)
+        self.assertEqual(result.status, solution.SOLVED)
+        self.assertEqual(result.values, TestDiagonalSudoku.solved_diag_sudoku)
+        self.assertGreaterEqual(result.stats['nodes'], 1)
+        result = solution.solve_bounded('1' + '.' * 39 + '1' + '.' * 40, max_nodes=1000)
+        self.assertEqual((result.status, result.values), (solution.UNSOLVABLE, None))
+
+    def test_nodes(self):
+        topo = topology.get_topology(5, 'diagonal')
+        for engine in ('bitmask', 'dlx'):
+            result = solution.solve_bounded(self.big_grid, max_nodes=5, topo=topo, engine=engine)
+            self.assertEqual((result.status, result.values), (solution.EXHAUSTED, None))
+            self.assertEqual(result.stats['nodes'], 6)
+            self.assertGreater(result.stats['solve.seconds'], 0)
+        result = solution.solve_bounded(self.diagonal_grid, max_nodes=0, engine='dict')
+        self.assertEqual(result.status, solution.EXHAUSTED)
+
+    def test_deadline(self):
+        topo = topology.get_topology(5, 'diagonal')
+        result = solution.solve_bounded(self.big_grid, max_seconds=0, topo=topo)
+        self.assertEqual(result.status, solution.EXHAUSTED)
+        self.assertEqual(result.stats['nodes'], 1)
+        self.assertGreater(result.stats['solve.seconds'], 0)
+
+    def test_deadline_in_propagation(self):
+        class PassBudget(solution.Budget):
+            # the deadline passes after a number of check_time() calls
+            def __init__(self, calls):
+                super().__init__()
+                self.calls = calls
+
+            def check_time(self):
+                self.calls -= 1
+                if self.calls < 0:
+                    raise solution.BudgetExhausted('deadline passed')
+
+        # the root node's check, then one propagation pass of the several it needs
+        result = solution.solve_bounded(self.diagonal_grid, budget=PassBudget(2))
+        self.assertEqual(result.status, solution.EXHAUSTED)
+        self.assertEqual((result.stats['nodes'], result.stats['propagations']), (1, 1))
+        self.assertRaises(solution.BudgetExhausted, solution.solve, self.diagonal_grid, budget=PassBudget(2))
+
+    def test_cancel(self):
+        budget = solution.Budget()
+        budget.cancel()
+        self.assertRaises(solution.BudgetExhausted, solution.solve, self.diagonal_grid, budget=budget)
+        self.assertRaises(solution.BudgetExhausted, solution.count_solutions, '.' * 81, budget=budget)
+
+    def test_solve_many(self):
+        grids = [self.diagonal_grid, '.' * 81]
+        results = list(solution.solve_many(grids, workers=1, max_nodes=3))
+        self.assertEqual(results[0].values, TestDiagonalSudoku.solved_diag_sudoku)
+        self.assertIsNone(results[1].values)
+        self.assertIn('budget', results[1].error)
+
+
+class TestDancingLinks(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def test_matches_bitmask(self):
+        for grid in solution.sample_grids:
+            self.assertEqual(solution.solve(grid, engine='dlx'), solution.solve(grid), grid)
+
+    def test_topologies(self):
+        classic = topology.get_topology(3, 'classic')
+        grid = TestTopology.classic_grid
+        TestTopology.assertSolved(self, solution.solve(grid, topo=classic, engine='dlx'), classic, grid)
+        topo = topology.get_topology(4, 'diagonal')
+        grid = '1' + '.' * 16 + 'G' + '.' * 238
+        TestTopology.assertSolved(self, solution.solve(grid, topo=topo, engine='dlx'), topo, grid)
+
+    def test_no_solution(self):
+        self.assertFalse(solution.solve('1' + '.' * 39 + '1' + '.' * 40, engine='dlx'))
+        self.assertFalse(solution.solve('11' + '.' * 79, engine='dlx'))
+
+    def test_candidates(self):
+        cells = solution.grid_bits(self.diagonal_grid)
+        solved = dlx.search_dlx(cells)
+        self.assertEqual(solution.bits_values(solved), TestDiagonalSudoku.solved_diag_sudoku)
+        # ruling out the solution's digit of one box leaves nothing to find
+        cells[1] &= ~solved[1]
+        self.assertFalse(dlx.search_dlx(cells))
+
+    def test_engine_switch(self):
+        self.assertRaises(ValueError, solution.solve, self.diagonal_grid, engine='magic')
+        self.assertRaises(ValueError, solution.solve, self.diagonal_grid, solution.Recorder(), engine='dlx')
+        self.assertEqual(solution.solve(self.diagonal_grid, engine='dict'),
+                         TestDiagonalSudoku.solved_diag_sudoku)
+
+
+class TestCountSolutions(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def test_unique(self):
+        for engine in ('bitmask', 'dlx'):
+            self.assertEqual(solution.count_solutions(self.diagonal_grid, engine=engine), 1)
+            self.assertEqual(solution.count_solutions(self.diagonal_grid, 2, engine=engine), 1)
+
+    def test_limit(self):
+        stats = Counter()
+        self.assertEqual(solution.count_solutions('.' * 81, 5, stats=stats), 5)
+        self.assertEqual(solution.count_solutions('.' * 81, 5, engine='dlx'), 5)
+        self.assertLess(stats['nodes'], 200)
+
+    def test_none(self):
+        self.assertEqual(solution.count_solutions('1' + '.' * 39 + '1' + '.' * 40, 2), 0)
+        self.assertEqual(solution.count_solutions('11' + '.' * 79, 2, engine='dlx'), 0)
+        self.assertRaises(ValueError, solution.count_solutions, self.diagonal_grid, engine='dict')
+        self.assertRaises(ValueError, solution.count_solutions, self.diagonal_grid[:80])
+
+    def test_several(self):
+        # the diagonal solution with A2, A3, D2 and D3 cleared: they hold 6 7 / 7 6,
+        # which can be swapped
+        grid = list(''.join(TestDiagonalSudoku.solved_diag_sudoku[s] for s in solution.boxes))
+        for s in ('A2', 'A3', 'D2', 'D3'):
+            grid[solution.boxes.index(s)] = '.'
+        self.assertEqual(solution.count_solutions(''.join(grid), 3), 2)
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        results = benchmark.run(n=2, seed=3)['results']
+        self.assertEqual(sorted(results), sorted(benchmark.CORPORA))
+        for corpus in benchmark.CORPORA:
+            n = 1 if corpus == 'samples' else 2
+            for name, r in results[corpus].items():
+                self.assertEqual((r['puzzles'], r['solved']), (n, n), (corpus, name))
+                self.assertGreaterEqual(r['nodes'], 1)
+                self.assertLessEqual(r['p50_ms'], r['p99_ms'])
+
+    def test_unique(self):
+        corpora = benchmark.build_corpora(2, 3)
+        for corpus, grids in corpora.items():
+            for grid in grids:
+                self.assertEqual(solution.count_solutions(grid, 2), 1, corpus)
+        self.assertTrue(all(81 - grid.count('.') == 40 for grid in corpora['easy']))
+
+
+class TestGenerator(unittest.TestCase):
+    def test_clues(self):
+        for variant in topology.VARIANTS:
+            topo = topology.get_topology(3, variant)
+            for grid in generator.generate(3, 30, topo, seed=1, workers=1):
+                self.assertEqual(81 - grid.count('.'), 30)
+                self.assertEqual(solution.count_solutions(grid, 2, topo), 1)
+
+    def test_minimal(self):
+        grid = generator.generate_one(7, 0)
+        self.assertEqual(solution.count_solutions(grid, 2), 1)
+        for i, g in enumerate(grid):
+            if g != '.':
+                self.assertEqual(solution.count_solutions(grid[:i] + '.' + grid[i + 1:], 2), 2)
+
+    def test_seeded(self):
+        puzzles = list(generator.generate(4, 28, seed=3, workers=1))
+        self.assertEqual(list(generator.generate(4, 28, seed=3, workers=2, chunksize=1)), puzzles)
+        self.assertEqual(len(set(puzzles)), 4)
+
+
+class TestSolveMany(unittest.TestCase):
+    grids = [TestDiagonalSudoku.diagonal_grid, '1' + '.' * 39 + '1' + '.' * 40, '123']
+
+    def check(self, results):
+        self.assertEqual([r.grid for r in results], self.grids)
+        solved, unsolvable, malformed = results
+        self.assertEqual(solved.values, TestDiagonalSudoku.solved_diag_sudoku)
+        self.assertIsNone(solved.error)
+        self.assertFalse(unsolvable.values)
+        self.assertIsNone(unsolvable.error)
+        self.assertFalse(malformed.values)
+        self.assertTrue(malformed.error)
+
+    def test_in_process(self):
+        self.check(list(solution.solve_many(iter(self.grids), workers=1)))
+
+    def test_process_pool(self):
+        self.check(list(solution.solve_many(iter(self.grids), workers=2, chunksize=1)))
+
+
+@unittest.skipIf(batch is None, 'NumPy is not installed')
+class TestBatch(unittest.TestCase):
+    def test_matches_solve(self):
+        corpora = benchmark.build_corpora(5, 2)
+        grids = solution.sample_grids + corpora['easy'] + corpora['hard']
+        self.assertEqual(batch.solve_batch(grids), [solution.solve(g) for g in grids])
+
+    def test_classic(self):
+        topo = topology.get_topology(3, 'classic')
+        grid = TestTopology.classic_grid
+        self.assertEqual(batch.solve_batch([grid, grid.encode('ascii')], topo),
+                         [solution.solve(grid, topo=topo)] * 2)
+
+    def test_contradictions(self):
+        grids = ['11' + '.' * 79, '1' + '.' * 39 + '1' + '.' * 40, TestDiagonalSudoku.diagonal_grid]
+        failed = batch.propagate_batch(batch.grids_array(grids))
+        self.assertEqual(failed.tolist(), [True, True, False])
+        self.assertRaises(ValueError, batch.grids_array, ['123'])
+        self.assertRaises(ValueError, batch.grids_array, ['x' * 81])
+
+    def test_solve_many(self):
+        grids = TestSolveMany.grids
+        expected = list(solution.solve_many(grids, workers=1))
+        results = list(solution.solve_many(iter(grids), workers=1, chunksize=2, vectorized=True))
+        self.assertEqual([(r.grid, r.values, bool(r.error)) for r in results],
+                         [(r.grid, r.values, bool(r.error)) for r in expected])
+
+
+class TestCanonical(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    def scramble(self, grid, move, digits):
+        relabel = dict(zip('123456789', digits))
+        return ''.join(relabel.get(grid[j], '.') for j in move)
+
+    def test_symmetries_keep_units(self):
+        for variant in topology.VARIANTS:
+            topo = topology.get_topology(3, variant)
+            units = set(frozenset(u) for u in topo.unit_indices)
+            moves = canonical.symmetries(topo)
+            self.assertEqual(len(moves), 96)
+            for move in moves:
+                self.assertEqual(set(frozenset(move[i] for i in u) for u in topo.unit_indices), units)
+
+    def test_equivalent_grids(self):
+        key = canonical.canonical_form(self.diagonal_grid)[0]
+        for move in canonical.symmetries()[::7]:
+            grid = self.scramble(self.diagonal_grid, move, '471239856')
+            self.assertEqual(canonical.canonical_form(grid)[0], key)
+        self.assertNotEqual(canonical.canonical_form(TestTopology.classic_grid)[0], key)
+
+    def test_cache(self):
+        cache = canonical.SolutionCache(maxsize=2)
+        self.assertEqual(cache.solve(self.diagonal_grid), TestDiagonalSudoku.solved_diag_sudoku)
+        grid = self.scramble(self.diagonal_grid, canonical.symmetries()[50], '935817624')
+        self.assertEqual(cache.solve(grid), solution.solve(grid))
+        self.assertFalse(cache.solve('1' + '.' * 39 + '1' + '.' * 40))
+        # the same clash, on I9 and E5 instead of A1 and E5
+        self.assertFalse(cache.solve('.' * 40 + '2' + '.' * 39 + '2'))
+        self.assertEqual(cache.metrics(), {'hits': 2, 'misses': 2, 'evictions': 0, 'size': 2, 'hit_rate': 0.5})
+        cache.solve(TestTopology.classic_grid)
+        self.assertEqual(cache.metrics()['evictions'], 1)
+        self.assertEqual(cache.metrics()['size'], 2)
+
+
+class TestServer(unittest.TestCase):
+    diagonal_grid = TestDiagonalSudoku.diagonal_grid
+
+    async def request(self, port, method, path, body=b''):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(('%s %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (method, path, len(body))).encode('ascii')
+                     + body)
+        response = await asyncio.wait_for(reader.read(), 30)
+        writer.close()
+        head, _, payload = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(payload.decode('utf-8'))
+
+    async def exercise(self):
+        app = server.SolveServer(workers=1, queue_size=1)
+        port = (await app.start('127.0.0.1', 0)).sockets[0].getsockname()[1]
+        try:
+            status, body = await self.request(port, 'POST', '/solve', self.diagonal_grid.encode('ascii'))
+            self.assertEqual(status, 200)
+            self.assertEqual(body['solution'], ''.join(TestDiagonalSudoku.solved_diag_sudoku[s]
+                                                       for s in solution.boxes))
+            status, body = await self.request(port, 'POST', '/solve', b'11' + b'.' * 79)
+            self.assertEqual((status, body['solution']), (200, None))
+            self.assertEqual((await self.request(port, 'POST', '/solve', b'123'))[0], 400)
+            self.assertEqual((await self.request(port, 'GET', '/solve'))[0], 405)
+            self.assertEqual((await self.request(port, 'GET', '/nowhere'))[0], 404)
+            # one grid queued, one solving if the worker took it in time, the rest turned away
+            statuses = [s for s, _ in await asyncio.gather(*[self.request(port, 'POST', '/solve', b'.' * 81)
+                                                             for _ in range(5)])]
+            self.assertIn(statuses.count(503), (3, 4))
+            self.assertEqual(statuses.count(200), 5 - statuses.count(503))
+            status, body = await self.request(port, 'GET', '/metrics')
+            self.assertEqual((body['requests'], body['503']), (10, statuses.count(503)))
+        finally:
+            await app.close()
+
+    async def exercise_timeout(self):
+        topo = topology.get_topology(5, 'diagonal')
+        app = server.SolveServer(workers=1, timeout=0.1, topo=topo)
+        port = (await app.start('127.0.0.1', 0)).sockets[0].getsockname()[1]
+        try:
+            self.assertEqual((await self.request(port, 'POST', '/solve', b'.' * 625))[0], 504)
+        finally:
+            await app.close()
+
+    async def exercise_slow_client(self):
+        app = server.SolveServer(workers=1, timeout=0.2)
+        port = (await app.start('127.0.0.1', 0)).sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'POST /solve HTTP/1.1\r\n')
+            response = await asyncio.wait_for(reader.read(), 30)
+            writer.close()
+            self.assertEqual(int(response.split()[1]), 408)
+            status, body = await self.request(port, 'GET', '/' + 'x' * server.MAX_LINE)
+            self.assertEqual(status, 400)
+        finally:
+            await app.close()
+
+    async def exercise_broken_pool(self):
+        loop = asyncio.get_running_loop()
+        app = server.SolveServer(workers=1)
+        port = (await app.start('127.0.0.1', 0)).sockets[0].getsockname()[1]
+        try:
+            self.assertEqual((await self.request(port, 'POST', '/solve', self.diagonal_grid.encode('ascii')))[0], 200)
+            pool = app.pool
+            os.kill(await loop.run_in_executor(pool, os.getpid), signal.SIGTERM)
+            # failing work marks the pool broken
+            with self.assertRaises(BrokenProcessPool):
+                await loop.run_in_executor(pool, os.getpid)
+            status, body = await self.request(port, 'POST', '/solve', self.diagonal_grid.encode('ascii'))
+            self.assertEqual(status, 200)
+            self.assertIsNot(app.pool, pool)
+        finally:
+            await app.close()
+
+    def test_server(self):
+        asyncio.run(self.exercise())
+
+    def test_broken_pool(self):
+        asyncio.run(self.exercise_broken_pool())
+
+    def test_timeout(self):
+        asyncio.run(self.exercise_timeout())
+
+    def test_slow_client(self):
+        asyncio.run(self.exercise_slow_client())
+
+
+class TestPuzzleIO(unittest.TestCase):
+    grid = TestDiagonalSudoku.diagonal_grid
+
+    def write(self, data):
+        f = tempfile.NamedTemporaryFile(suffix='.txt', delete=False)
+        f.write(data)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_read_text(self):
+        path = self.write(b'# comment\r\n' + self.grid.encode() + b'\r\n\n' + self.grid.replace('.', '0').encode())
+        grids = list(puzzle_io.read_grids(path))
+        self.assertEqual(grids, [self.grid.encode(), self.grid.replace('.', '0').encode()])
+        self.assertEqual(solution.solve(grids[0]), TestDiagonalSudoku.solved_diag_sudoku)
+
+    def test_read_binary(self):
+        record = puzzle_io.pack_grid(self.grid)
+        self.assertEqual(len(record), puzzle_io.RECORD_SIZE)
+        path = self.write(record * 2)
+        self.assertEqual(list(puzzle_io.read_grids(path, binary=True)), [self.grid.replace('.', '0').encode()] * 2)
+
+    def test_read_empty(self):
+        self.assertEqual(list(puzzle_io.read_grids(self.write(b''))), [])
+
+
 if __name__ == '__main__':
     unittest.main()
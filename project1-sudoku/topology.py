@@ -0,0 +1,120 @@
+"""
+Board topology of an N x N sudoku (N = size ** 2): box names, units and peers, plus
+the index tables the bitmask engine runs on. Building them means a few thousand set
+operations for 9 x 9 and far more for 16 x 16 or 25 x 25, so get_topology() builds
+each (size, variant) once and hands out the same object afterwards.
+"""
+VARIANTS = ('classic', 'diagonal')
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+ROW_NAMES = 'ABCDEFGHIJKLMNOPQRSTUVWXY'
+
+
+def cross(a, b):
+    return [s + t for s in a for t in b]
+
+
+class Topology(object):
+    """
+    Everything about the shape of a board that does not depend on its contents.
+
+    Named form, as used by the dictionary engine:
+        rows, cols, digits, boxes, row_units, column_units, square_units,
+        diagonal_units (empty for 'classic'), unitlist (all of them),
+        units (box -> its units), peers (box -> set of boxes sharing a unit).
+
+    Index form, as used by the bitmask engine, where a board is a flat list with one
+    int per box and bit d set if digits[d] is still possible:
+        cells, all_digits, box_index, digit_masks, cell_masks (grid char or byte ->
+        mask), unit_indices, peer_indices, box_units (box -> ids in unitlist),
+        pair_masks (every mask with exactly two candidates),
+        popcount (mask -> number of candidates) and mask_digits (mask -> str).
+    """
+    def __init__(self, size=3, variant='diagonal'):
+        if variant not in VARIANTS:
+            raise ValueError('unknown variant %r, expected one of %s' % (variant, ', '.join(VARIANTS)))
+        if not 2 <= size <= 5:
+            raise ValueError('box size must be between 2 and 5, got %r' % size)
+        n = size * size
+        self.size = size
+        self.variant = variant
+        self.rows = ROW_NAMES[:n]
+        self.cols = [str(c) for c in range(1, n + 1)]
+        self.digits = SYMBOLS[:n]
+        self.boxes = cross(self.rows, self.cols)
+        self.row_units = [cross(r, self.cols) for r in self.rows]
+        self.column_units = [cross(self.rows, [c]) for c in self.cols]
+        row_bands = [self.rows[i:i + size] for i in range(0, n, size)]
+        col_stacks = [self.cols[i:i + size] for i in range(0, n, size)]
+        self.square_units = [cross(rs, cs) for rs in row_bands for cs in col_stacks]
+        if variant == 'diagonal':
+            self.diagonal_units = [[r + c for r, c in zip(self.rows, self.cols)],
+                                   [r + c for r, c in zip(self.rows, self.cols[::-1])]]
+        else:
+            self.diagonal_units = []
+        self.unitlist = self.row_units + self.column_units + self.square_units + self.diagonal_units
+        self.units = dict((s, [u for u in self.unitlist if s in u]) for s in self.boxes)
+        self.peers = dict((s, set(sum(self.units[s], [])) - set([s])) for s in self.boxes)
+
+        self.cells = n * n
+        self.all_digits = (1 << n) - 1
+        self.box_index = dict((s, i) for i, s in enumerate(self.boxes))
+        self.digit_masks = dict((d, 1 << i) for i, d in enumerate(self.digits))
+        # keyed by both str chars and byte values so bytes grids work too
+        self.cell_masks = dict(self.digit_masks, **{'.': self.all_digits, '0': self.all_digits})
+        self.cell_masks.update([(ord(c), m) for c, m in list(self.cell_masks.items())])
+        self.cell_masks.update([(c.lower(), m) for c, m in self.digit_masks.items() if c.isalpha()])
+        self.unit_indices = tuple(tuple(self.box_index[s] for s in u) for u in self.unitlist)
+        self.peer_indices = tuple(tuple(sorted(self.box_index[p] for p in self.peers[s])) for s in self.boxes)
+        bits = [1 << i for i in range(n)]
+        self.pair_masks = frozenset(a | b for a in bits for b in bits if a < b)
+        self.box_units = tuple(tuple(i for i, u in enumerate(self.unit_indices) if b in u)
+                               for b in range(self.cells))
+        if n <= 9:
+            self.mask_digits = tuple(self._mask_digits(m) for m in range(self.all_digits + 1))
+            self.popcount = tuple(len(s) for s in self.mask_digits)
+        else:
+            # 2 ** 16 and 2 ** 25 entry tables cost more to build than they save
+            self.mask_digits = MaskTable(self._mask_digits)
+            self.popcount = MaskTable(popcount)
+
+    def _mask_digits(self, m):
+        return ''.join(d for i, d in enumerate(self.digits) if m >> i & 1)
+
+    def __reduce__(self):
+        # pickle as the cache key, so process pools rebuild (once) instead of shipping tables
+        return get_topology, (self.size, self.variant)
+
+    def __repr__(self):
+        return 'get_topology(%d, %r)' % (self.size, self.variant)
+
+
+def popcount(m):
+    return bin(m).count('1')
+
+
+class MaskTable(object):
+    """
+    Stands in for a tuple indexed by candidate mask, computing entries on demand.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def __getitem__(self, m):
+        return self.f(m)
+
+
+# (size, variant) -> Topology
+topologies = {}
+
+
+def get_topology(size=3, variant='diagonal'):
+    """
+    The Topology of boards made of size x size squares, built on first use.
+    Args:
+        size(int): 3 for 9 x 9, 4 for 16 x 16, 5 for 25 x 25.
+        variant(str): 'classic', or 'diagonal' to add both main diagonals as units.
+    """
+    key = (size, variant)
+    if key not in topologies:
+        topologies[key] = Topology(size, variant)
+    return topologies[key]
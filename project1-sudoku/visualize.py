@@ -1,17 +1,49 @@
-from PySudoku import play
+import argparse
+import sys
 
-def visualize_assignments(assignments):
-    """ Visualizes the set of assignments created by the Sudoku AI"""
-    last_assignment = None
-    filtered_assignments = []
+from PySudoku import play, render
 
-    for i in range(len(assignments)):
-        if last_assignment:
-            last_assignment_items = [item for item in last_assignment.items() if len(item[1]) == 1]
-            current_assignment_items = [item for item in assignments[i].items() if len(item[1]) == 1]
-            shared_items = set(last_assignment_items) & set(current_assignment_items)
-            if len(shared_items) < len(current_assignment_items):
-                filtered_assignments.append(assignments[i])
-        last_assignment = assignments[i]
 
-    play(filtered_assignments)
+def frames(assignments):
+    """ The boards to show for assignments, a list of boards or a solution.Recorder.
+    A Recorder is replayed lazily, one board per step that solves or unsolves a box;
+    the same dictionary is updated in place, which is all the renderer needs. """
+    if hasattr(assignments, 'replay'):
+        return (values for (box, old, new), values in assignments.replay() if len(new) == 1 or len(old) == 1)
+    return iter(assignments)
+
+def visualize_assignments(assignments, output=None):
+    """ Visualizes the set of assignments created by the Sudoku AI.
+    assignments is either a list of boards or a solution.Recorder, whose steps are replayed.
+    Only the squares that change between boards are redrawn, and boards that change nothing
+    on screen are skipped. With output, the boards are rendered offscreen instead of in a
+    window, to a GIF or to numbered images (see PySudoku.render), and the number of frames
+    is returned."""
+    if output is None:
+        play(frames(assignments))
+    else:
+        return render(frames(assignments), output)
+
+def main(argv=None):
+    import solution
+    parser = argparse.ArgumentParser(description='Render the solve trace of a grid without a window.')
+    parser.add_argument('grid', help='81-char grid')
+    parser.add_argument('-o', '--output', required=True,
+                        help="a .gif file (needs Pillow) or a pattern such as 'frames/%%04d.png'")
+    parser.add_argument('--maxlen', type=int, default=10000, help='steps recorded at most')
+    args = parser.parse_args(argv)
+    if not args.output.lower().endswith('.gif') and '%' not in args.output:
+        parser.error('output must be a .gif file or contain a %d for the frame number')
+
+    recorder = solution.Recorder(args.maxlen)
+    if not solution.solve(args.grid, recorder):
+        print('no solution', file=sys.stderr)
+    try:
+        count = visualize_assignments(recorder, args.output)
+    except ImportError:
+        parser.error('GIF output needs Pillow; write numbered images instead')
+    print('%d frames written' % count, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,458 @@
+import sys, os.path
+sys.path.append(os.path.dirname(__file__))
+import copy
+import gc
+import multiprocessing
+import random
+import time
+import unittest
+
+import game_agent
+
+
+class Board(object):
+    """Just enough of isolation.Board for game_agent: players move like knights,
+    starting anywhere blank, and lose when the player to move has no move."""
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._active_player = player_1
+        self._inactive_player = player_2
+        self._blank = {(r, c) for r in range(height) for c in range(width)}
+        self._locations = {player_1: None, player_2: None}
+
+    @property
+    def active_player(self):
+        return self._active_player
+
+    @property
+    def inactive_player(self):
+        return self._inactive_player
+
+    def get_opponent(self, player):
+        if player == self._active_player:
+            return self._inactive_player
+        if player == self._inactive_player:
+            return self._active_player
+        raise RuntimeError("`player` must be an object registered as a player in the current game.")
+
+    def copy(self):
+        board = copy.copy(self)
+        board._blank = set(self._blank)
+        board._locations = dict(self._locations)
+        return board
+
+    def forecast_move(self, move):
+        board = self.copy()
+        board.apply_move(move)
+        return board
+
+    def move_is_legal(self, move):
+        return move in self._blank
+
+    def get_blank_spaces(self):
+        return [(r, c) for c in range(self.width) for r in range(self.height) if (r, c) in self._blank]
+
+    def get_player_location(self, player):
+        return self._locations[player]
+
+    def get_legal_moves(self, player=None):
+        if player is None:
+            player = self._active_player
+        location = self._locations[player]
+        if location is None:
+            return self.get_blank_spaces()
+        r, c = location
+        return [(r + dr, c + dc) for dr, dc in game_agent.KNIGHT_DIRECTIONS if (r + dr, c + dc) in self._blank]
+
+    def apply_move(self, move):
+        self._locations[self._active_player] = move
+        self._blank.discard(move)
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def is_winner(self, player):
+        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
+
+    def is_loser(self, player):
+        return player == self._active_player and not self.get_legal_moves(self._active_player)
+
+    def utility(self, player):
+        if self.get_legal_moves(self._active_player):
+            return 0.
+        return float("inf") if player == self._inactive_player else float("-inf")
+
+
+def random_game(rng, player_1, player_2, plies, width=7, height=7):
+    """A Board after up to plies random moves."""
+    game = Board(player_1, player_2, width, height)
+    for _ in range(plies):
+        moves = game.get_legal_moves()
+        if not moves:
+            break
+        game.apply_move(rng.choice(moves))
+    return game
+
+def same_position(game, active, inactive):
+    """A Board of the position of game with other players: active in place of
+    the player to move, inactive in place of the other one."""
+    board = Board(active, inactive, game.width, game.height)
+    board._blank = set(game._blank)
+    board._locations = {active: game.get_player_location(game.active_player),
+                        inactive: game.get_player_location(game.inactive_player)}
+    board.move_count = game.move_count
+    return board
+
+def position_score(game, player):
+    """Mobility plus a small value drawn from the position, so that no two
+    positions score alike and the best move is unique unless the game is won or
+    lost. The same on a Board and on a BitBoard of it."""
+    over, own_moves, opp_moves = game_agent.mobility(game, player)
+    if over is not None:
+        return over
+    locations = (game.get_player_location(player), game.get_player_location(game.get_opponent(player)))
+    return own_moves - opp_moves + random.Random(str((locations, game.get_blank_spaces()))).random() / 10
+
+def minimax_value(game, depth, player, score_fn):
+    """Plain minimax value of game to depth for player, on the Board itself."""
+    legal_moves = game.get_legal_moves()
+    if depth == 0 or not legal_moves:
+        return score_fn(game, player)
+    values = [minimax_value(game.forecast_move(m), depth - 1, player, score_fn) for m in legal_moves]
+    return max(values) if game.active_player == player else min(values)
+
+def main_process_score(game, player):
+    """custom_score, failing in any process but the main one."""
+    if multiprocessing.current_process().name != 'MainProcess':
+        raise ValueError('not in the main process')
+    return game_agent.custom_score(game, player)
+
+def worker_exit_score(game, player):
+    """custom_score, ending any process but the main one."""
+    if multiprocessing.current_process().name != 'MainProcess':
+        os._exit(1)
+    return game_agent.custom_score(game, player)
+
+def timer(limit):
+    """A time_left() for a turn of limit milliseconds starting now."""
+    start = time.perf_counter()
+    return lambda: limit - 1000 * (time.perf_counter() - start)
+
+
+class TestScores(unittest.TestCase):
+
+    def positions(self):
+        rng = random.Random(6)
+        for plies in range(2, 30, 3):
+            players = (object(), object())
+            game = random_game(rng, players[0], players[1], plies)
+            yield game, players
+
+    def test_seeded(self):
+        differ = 0
+        for game, players in self.positions():
+            board = game_agent.BitBoard(game, players[0])
+            for player in players:
+                score = game_agent.EdgePenaltyScore(7)(game, player)
+                self.assertEqual(game_agent.EdgePenaltyScore(7)(game, player), score)
+                self.assertEqual(game_agent.EdgePenaltyScore(7)(board, player), score)
+                differ += game_agent.EdgePenaltyScore(8)(game, player) != score
+        self.assertGreater(differ, 0)
+
+    def test_custom_score_repeatable(self):
+        for game, players in self.positions():
+            for player in players:
+                score = game_agent.custom_score(game, player)
+                self.assertEqual(game_agent.custom_score(game.copy(), player), score)
+                self.assertEqual(game_agent.EdgePenaltyScore(0)(game, player), score)
+
+    def test_edge_penalties(self):
+        factors = game_agent.EdgePenaltyScore(3).get_factors(7, 5)
+        for (y, x), factor in factors.items():
+            edges = (x in (0, 6)) + (y in (0, 4))
+            self.assertEqual(factor == 1, edges == 0)
+            self.assertGreaterEqual(factor, 1 - 0.6 * edges)
+
+
+class TestBitBoard(unittest.TestCase):
+
+    def assertSameBoard(self, board, game, players):
+        for player in players:
+            self.assertEqual(board.get_legal_moves(player), sorted(game.get_legal_moves(player),
+                                                                   key=lambda m: (m[1], m[0])))
+            self.assertEqual(board.get_player_location(player), game.get_player_location(player))
+            self.assertEqual(board.is_winner(player), game.is_winner(player))
+            self.assertEqual(board.is_loser(player), game.is_loser(player))
+            self.assertEqual(board.utility(player), game.utility(player))
+            self.assertIs(board.get_opponent(player), game.get_opponent(player))
+        self.assertEqual(board.get_blank_spaces(), game.get_blank_spaces())
+        self.assertIs(board.active_player, game.active_player)
+        self.assertIs(board.inactive_player, game.inactive_player)
+        self.assertEqual(board.move_count, game.move_count)
+
+    def test_board_api(self):
+        rng = random.Random(3)
+        for width, height in ((7, 7), (5, 7), (7, 5), (3, 4)):
+            for trial in range(5):
+                players = (object(), object())
+                me = players[trial % 2]
+                game = Board(players[0], players[1], width, height)
+                board = game_agent.BitBoard(game, me)
+                while True:
+                    self.assertSameBoard(board, game, players)
+                    # the key kept up by make() is the one of the position
+                    fresh = game_agent.BitBoard(game, me)
+                    self.assertEqual((board.key, board.blank, board.locations, board.turn),
+                                     (fresh.key, fresh.blank, fresh.locations, fresh.turn))
+                    for move in ((r, c) for r in range(-1, height + 1) for c in range(-1, width + 1)):
+                        self.assertEqual(board.move_is_legal(move), game.move_is_legal(move))
+                    legal_moves = game.get_legal_moves()
+                    if not legal_moves:
+                        break
+                    before = (board.key, board.blank, list(board.locations), board.turn, board.move_count)
+                    for move in legal_moves:
+                        board.make(board.index(move))
+                        self.assertSameBoard(board, game.forecast_move(move), players)
+                        board.unmake(board.index(move))
+                        self.assertEqual((board.key, board.blank, board.locations, board.turn, board.move_count),
+                                         before)
+                    self.assertSameBoard(board.forecast_move(legal_moves[0]), game.forecast_move(legal_moves[0]),
+                                         players)
+                    move = rng.choice(legal_moves)
+                    game.apply_move(move)
+                    board.make(board.index(move))
+
+    def test_keys_by_point_of_view(self):
+        # the same position from the same side hashes the same whoever plays it
+        rng = random.Random(5)
+        me, other = object(), object()
+        game = random_game(rng, me, other, 6)
+        swapped = same_position(game, other, me)
+        self.assertEqual(game_agent.BitBoard(game, game.active_player).key,
+                         game_agent.BitBoard(swapped, swapped.active_player).key)
+        self.assertNotEqual(game_agent.BitBoard(game, game.active_player).key,
+                            game_agent.BitBoard(game, game.inactive_player).key)
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_store_probe(self):
+        table = game_agent.TranspositionTable(64)
+        self.assertIsNone(table.probe(5))
+        table.store(5, 3, game_agent.LOWER, 1.5, 12)
+        self.assertEqual(table.probe(5), (3, game_agent.LOWER, 1.5, 12, 0))
+        self.assertIsNone(table.probe(5 + 64))
+        table.store(7, 2, game_agent.EXACT, float("-inf"), None)
+        self.assertEqual(table.probe(7), (2, game_agent.EXACT, float("-inf"), None, 0))
+
+    def test_replacement(self):
+        table = game_agent.TranspositionTable(64)
+        table.store(5, 3, game_agent.EXACT, 1., 1)
+        # a shallower search of another key in the slot does not replace it
+        table.store(5 + 64, 2, game_agent.EXACT, 2., 2)
+        self.assertEqual(table.probe(5)[2], 1.)
+        table.store(5 + 64, 3, game_agent.EXACT, 2., 2)
+        self.assertEqual(table.probe(5 + 64)[2], 2.)
+        # entries of an earlier search always give way
+        table.new_search()
+        table.store(5, 1, game_agent.EXACT, 3., 3)
+        self.assertEqual(table.probe(5), (1, game_agent.EXACT, 3., 3, 1))
+
+    def test_untracked(self):
+        # no object per entry for the garbage collector to walk
+        table = game_agent.TranspositionTable(1 << 10)
+        gc.collect()
+        tracked = len(gc.get_objects())
+        for key in range(1, 2000):
+            table.store(key * 7919, 3, game_agent.EXACT, 0.5, 12)
+        self.assertLess(len(gc.get_objects()) - tracked, 10)
+
+    def test_timed_move_warm_table(self):
+        rng = random.Random(1)
+        player_1 = game_agent.AlphaBetaPlayer(score_fn=game_agent.EdgePenaltyScore(1))
+        player_2 = game_agent.AlphaBetaPlayer(score_fn=game_agent.EdgePenaltyScore(2))
+        game = random_game(rng, player_1, player_2, 2)
+        for _ in range(14):
+            legal_moves = game.get_legal_moves()
+            if not legal_moves:
+                break
+            time_left = timer(150)
+            move = game.active_player.get_move(game.copy(), time_left)
+            self.assertGreaterEqual(time_left(), 0)
+            self.assertIn(move, legal_moves)
+            game.apply_move(move)
+
+
+class NoTable(object):
+    def new_search(self):
+        pass
+
+    def probe(self, key):
+        return None
+
+    def store(self, key, depth, bound, value, move):
+        pass
+
+
+class PlainAlphaBetaPlayer(game_agent.AlphaBetaPlayer):
+    """AlphaBetaPlayer without its transposition table and move ordering."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.table = NoTable()
+
+    def order_moves(self, moves, first, ply, own):
+        pass
+
+    def record_cutoff(self, move, ply, own, depth):
+        pass
+
+
+class TestMinimax(unittest.TestCase):
+
+    def test_minimax_value(self):
+        rng = random.Random(4)
+        searched = 0
+        for trial in range(30):
+            player = game_agent.MinimaxPlayer(score_fn=position_score)
+            opponent = object()
+            players = (player, opponent) if trial % 2 else (opponent, player)
+            game = random_game(rng, *players, plies=rng.randint(2, 24))
+            if game.active_player is not player or not game.get_legal_moves():
+                continue
+            searched += 1
+            player.time_left = lambda: float("inf")
+            for depth in range(1, 4):
+                move = player.minimax(game, depth)
+                self.assertIn(move, game.get_legal_moves())
+                self.assertEqual(minimax_value(game.forecast_move(move), depth - 1, player, position_score),
+                                 minimax_value(game, depth, player, position_score))
+        self.assertGreaterEqual(searched, 8)
+
+
+class TestAlphaBeta(unittest.TestCase):
+
+    def test_minimax_value(self):
+        rng = random.Random(2)
+        searched = 0
+        for trial in range(40):
+            player = game_agent.AlphaBetaPlayer(score_fn=position_score)
+            plain = PlainAlphaBetaPlayer(score_fn=position_score)
+            opponent = object()
+            players = (player, opponent) if trial % 2 else (opponent, player)
+            game = random_game(rng, *players, plies=rng.randint(2, 24))
+            if game.active_player is not player or not game.get_legal_moves():
+                continue
+            plain_game = same_position(game, plain, opponent)
+            searched += 1
+            player.time_left = plain.time_left = lambda: float("inf")
+            # the table and the ordering are kept from one depth to the next
+            for depth in range(1, 5):
+                value = minimax_value(game, depth, player, position_score)
+                found, move = player.search(game, depth)
+                plain_found, plain_move = plain.search(plain_game, depth)
+                self.assertEqual(found, value)
+                self.assertEqual(plain_found, value)
+                if abs(value) != float("inf"):
+                    self.assertEqual(move, plain_move)
+                self.assertEqual(minimax_value(game.forecast_move(move), depth - 1, player, position_score),
+                                 value)
+        self.assertGreaterEqual(searched, 10)
+
+    def test_order_moves(self):
+        player = game_agent.AlphaBetaPlayer()
+        player.history[1].update({4: 9, 5: 1, 6: 4})
+        player.record_cutoff(7, 2, 1, 1)
+        player.record_cutoff(8, 2, 1, 1)
+        moves = [3, 4, 5, 6, 7, 8]
+        player.order_moves(moves, 5, 2, 1)
+        # the stored move, the killers (latest first), then by history
+        self.assertEqual(moves, [5, 8, 7, 4, 6, 3])
+        self.assertEqual(player.killers[2], [8, 7])
+        self.assertEqual(player.history[1][8], 1)
+
+
+class TestSearchClock(unittest.TestCase):
+
+    def test_reads(self):
+        clock = game_agent.SearchClock()
+        self.assertRaises(game_agent.SearchTimeout, clock.start, lambda: 5., 10.)
+        clock.start(lambda: 1000., 10.)
+        self.assertEqual(clock.next_check, 1)
+        # no time passing: the step doubles, up to the cap
+        for _ in range(20):
+            clock.nodes = clock.next_check
+            clock.check()
+        self.assertEqual(clock.step, game_agent.MAX_CHECK_NODES)
+
+    def test_jump(self):
+        # nodes so fast that the rate alone would read the clock every 10000
+        # nodes, then the clock jumps to below the threshold, as after a pause
+        rng = random.Random(7)
+        player = game_agent.AlphaBetaPlayer()
+        game = random_game(rng, player, object(), 2)
+        clock = player.clock
+        jump = 3000
+        player.time_left = lambda: 1000. - clock.nodes * 1e-4 if clock.nodes < jump else 5.
+        with self.assertRaises(game_agent.SearchTimeout):
+            player.search(game, 20)
+        self.assertEqual(clock.step, game_agent.MAX_CHECK_NODES)
+        self.assertLessEqual(clock.nodes - jump, game_agent.MAX_CHECK_NODES)
+
+
+class TestParallel(unittest.TestCase):
+
+    def play(self, player, plies):
+        """Timed moves of player against a random opponent; the moves returned."""
+        rng = random.Random(4)
+        game = random_game(rng, player, object(), 2)
+        moves = []
+        for _ in range(plies):
+            legal_moves = game.get_legal_moves()
+            if not legal_moves:
+                break
+            if game.active_player is player:
+                time_left = timer(150)
+                move = player.get_move(game.copy(), time_left)
+                self.assertGreaterEqual(time_left(), 0)
+                self.assertIn(move, legal_moves)
+                moves.append(move)
+            else:
+                move = rng.choice(legal_moves)
+            game.apply_move(move)
+        return moves
+
+    def test_workers(self):
+        with game_agent.AlphaBetaPlayer(workers=2) as player:
+            # running before the first move
+            self.assertIsNotNone(player.pool)
+            self.assertTrue(self.play(player, 6))
+            self.assertTrue(player.worker_stats)
+            for nodes, seconds, rate in player.worker_stats:
+                self.assertGreater(nodes, 0)
+                self.assertAlmostEqual(rate, nodes / seconds)
+        self.assertIsNone(player.pool)
+
+    def test_worker_failure(self):
+        with game_agent.AlphaBetaPlayer(score_fn=worker_exit_score, workers=2) as player:
+            # the first move falls back to searching here
+            with self.assertWarns(RuntimeWarning):
+                self.assertTrue(self.play(player, 4))
+            self.assertIsNone(player.pool)
+
+    def test_worker_error(self):
+        # an error of the search itself is not hidden by the fallback
+        with game_agent.AlphaBetaPlayer(score_fn=main_process_score, workers=2) as player:
+            with self.assertRaises(ValueError):
+                self.play(player, 4)
+
+    def test_pool_finalized(self):
+        player = game_agent.AlphaBetaPlayer(workers=2)
+        pool = player.pool
+        del player
+        gc.collect()
+        self.assertRaises(RuntimeError, pool.submit, int)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,16 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import multiprocessing
+import pickle
 import random
 import math
+import time
+import warnings
+import weakref
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
@@ -18,6 +26,39 @@ def is_at_corner(w, h, x, y):
     cy = y == 0 or y == h - 1
     return cx and cy
 
+try:
+    popcount = int.bit_count
+except AttributeError:      # before Python 3.10
+    def popcount(mask):
+        return bin(mask).count("1")
+
+def mobility(game, player):
+    """Count the legal moves of player and of its opponent once, for a score
+    function to use both for the win/loss checks and for the score.
+
+    On a `BitBoard` the counts are popcounts of the move masks; on any other
+    `isolation.Board` they are the lengths of `get_legal_moves()`.
+
+    Returns
+    -------
+    (float or None, int, int)
+        -inf if player has lost, inf if it has won, None otherwise (the same as
+        `is_loser()`/`is_winner()` tell), then the own and opponent move counts.
+    """
+    if isinstance(game, BitBoard):
+        side = game.side(player)
+        own_moves = popcount(game.moves_mask(side))
+        opp_moves = popcount(game.moves_mask(side ^ 1))
+    else:
+        own_moves = len(game.get_legal_moves(player))
+        opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    if player == game.active_player:
+        if not own_moves:
+            return float("-inf"), own_moves, opp_moves
+    elif not opp_moves:
+        return float("inf"), own_moves, opp_moves
+    return None, own_moves, opp_moves
+
 def custom_score(game, player):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
@@ -41,24 +82,11 @@ def custom_score(game, player):
     -------
     float
         The heuristic value of the current game state to the specified player.
-    <=> based on improved_score. randonly reduce score a bit if the location is 
-        close to edge,  
+    <=> based on improved_score. reduce score a bit if the location is close
+        to edge, by a random penalty drawn once per location (see
+        EdgePenaltyScore), so the same position always scores the same
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
-
-    w, h = game.width, game.height
-    y, x = game.get_player_location(player)
-    random_interval = 0.6
-    rx = random.uniform(0, random_interval) if x == 0 or x == w - 1 else 0
-    ry = random.uniform(0, random_interval) if y == 0 or y == h - 1 else 0
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
-    score = float(own_moves - opp_moves)
-    return score * (1 - rx - ry)
+    return edge_penalty_score(game, player)
 
 def custom_score_2(game, player):
     """Calculate the heuristic value of a game state from the point of view
@@ -83,14 +111,10 @@ def custom_score_2(game, player):
         The heuristic value of the current game state to the specified player.
     <=> based on improved_score, randomly add or reduce score a bit 
     """
-    if game.is_loser(player):
-        return float("-inf")
+    over, own_moves, opp_moves = mobility(game, player)
+    if over is not None:
+        return over
 
-    if game.is_winner(player):
-        return float("inf")
-
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
     score = own_moves - opp_moves
     w, h = game.width / 2., game.height / 2.
     y, x = game.get_player_location(player)
@@ -120,14 +144,10 @@ def custom_score_3(game, player):
         The heuristic value of the current game state to the specified player.
         within improved score prefer the move closer to opponent's location
     """
-    if game.is_loser(player):
-        return float("-inf")
-
-    if game.is_winner(player):
-        return float("inf")
+    over, own_moves, opp_moves = mobility(game, player)
+    if over is not None:
+        return over
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
     score = float(own_moves - opp_moves)
     y1, x1 = game.get_player_location(player)
     w, h = game.width, game.height
@@ -139,6 +159,390 @@ def custom_score_3(game, player):
     rev_distance_ratio = (1.0 - (distance / max_distance))
     return score * (1.0 + rev_distance_ratio)
 
+class EdgePenaltyScore:
+    """The score of custom_score, with the edge penalties drawn from `seed`,
+    for use as `score_fn`.
+
+    The penalties of each board size are drawn once, at random up to
+    `interval` for a location on an edge row or column, so a position always
+    scores the same: values stored in the transposition table stay valid, and
+    runs with the same seed play the same games. custom_score uses seed 0; pass
+    `score_fn=EdgePenaltyScore(seed)` to give a game its own seed.
+
+    Parameters
+    ----------
+    seed : int
+        Seed of the penalties.
+
+    interval : float
+        Upper bound of the penalty drawn for an edge row or column, as in
+        custom_score.
+    """
+    def __init__(self, seed=0, interval=0.6):
+        self.seed = seed
+        self.interval = interval
+        # (width, height) -> {location: score factor}
+        self.factors = {}
+
+    def get_factors(self, width, height):
+        if (width, height) not in self.factors:
+            rng = random.Random(self.seed)
+            factors = {}
+            for x in range(width):
+                for y in range(height):
+                    rx = rng.uniform(0, self.interval) if x == 0 or x == width - 1 else 0
+                    ry = rng.uniform(0, self.interval) if y == 0 or y == height - 1 else 0
+                    factors[(y, x)] = 1 - rx - ry
+            self.factors[(width, height)] = factors
+        return self.factors[(width, height)]
+
+    def __call__(self, game, player):
+        over, own_moves, opp_moves = mobility(game, player)
+        if over is not None:
+            return over
+
+        factors = self.get_factors(game.width, game.height)
+        return float(own_moves - opp_moves) * factors[game.get_player_location(player)]
+
+# the penalties of custom_score
+edge_penalty_score = EdgePenaltyScore()
+
+# bound types of a transposition table entry: its value is exact, a lower bound
+# (the search failed high) or an upper bound (it failed low)
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# killer moves AlphaBetaPlayer keeps per ply
+KILLERS = 2
+
+# entries of an AlphaBetaPlayer's transposition table, 25 bytes each
+TABLE_SIZE = 1 << 18
+
+class ZobristKeys:
+    """Random 64-bit keys for hashing positions of a board size.
+
+    The key of a position is the xor of the keys of its blocked cells and of
+    both player locations, plus `own_turn` when the player searching is the
+    one to move. Locations are keyed as the searching player's own or as its
+    opponent's rather than as player 1 or 2, so the same position from the
+    same point of view hashes the same whichever side the agent plays.
+    """
+    def __init__(self, width, height, seed=0):
+        rng = random.Random(seed)
+        cells = width * height
+        self.blocked = [rng.getrandbits(64) for _ in range(cells)]
+        # one more location for a player that has not moved yet
+        self.own = [rng.getrandbits(64) for _ in range(cells + 1)]
+        self.opp = [rng.getrandbits(64) for _ in range(cells + 1)]
+        self.own_turn = rng.getrandbits(64)
+
+# (width, height) -> ZobristKeys
+zobrist_keys = {}
+
+def get_zobrist(width, height):
+    if (width, height) not in zobrist_keys:
+        zobrist_keys[(width, height)] = ZobristKeys(width, height)
+    return zobrist_keys[(width, height)]
+
+KNIGHT_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+
+class KnightMoves:
+    """Knight-move masks of a board size.
+
+    Cells are numbered as `isolation.Board` numbers them, `row + col * height`,
+    and cell i is bit i of a mask. `masks[i]` has a bit set for every cell a
+    knight reaches from cell i; `masks[width * height]`, the location of a
+    player that has not moved yet, has every cell set. `locations[i]` is the
+    (row, col) of cell i.
+    """
+    def __init__(self, width, height):
+        cells = width * height
+        self.locations = [(i % height, i // height) for i in range(cells)]
+        self.masks = []
+        for r, c in self.locations:
+            mask = 0
+            for dr, dc in KNIGHT_DIRECTIONS:
+                if 0 <= r + dr < height and 0 <= c + dc < width:
+                    mask |= 1 << (r + dr + (c + dc) * height)
+            self.masks.append(mask)
+        self.masks.append((1 << cells) - 1)
+
+# (width, height) -> KnightMoves
+knight_moves = {}
+
+def get_knight_moves(width, height):
+    if (width, height) not in knight_moves:
+        knight_moves[(width, height)] = KnightMoves(width, height)
+    return knight_moves[(width, height)]
+
+def bit_indices(mask):
+    """Indices of the bits set in mask, lowest first."""
+    indices = []
+    while mask:
+        bit = mask & -mask
+        indices.append(bit.bit_length() - 1)
+        mask ^= bit
+    return indices
+
+class BitBoard:
+    """Compact copy of an `isolation.Board` for searching, from the point of
+    view of one of its players.
+
+    The blank cells are one int, a bit per cell, and the two player locations
+    are cell indices, `locations[0]` for player and `locations[1]` for its
+    opponent (`width * height` until a player has moved); `turn` is the index
+    of the player to move. Legal moves are the knight-move mask of a location
+    and-ed with the blank cells. make() and unmake() play and take back a move
+    in place, keeping the Zobrist `key` of the position up to date.
+
+    The `isolation.Board` methods that score functions use are implemented
+    too, with the same results (legal moves come in cell order rather than
+    shuffled), so a BitBoard can be handed to any `score_fn`.
+    """
+    def __init__(self, game, player):
+        self.width = game.width
+        self.height = game.height
+        self.move_count = game.move_count
+        self.moves = get_knight_moves(game.width, game.height)
+        self.zobrist = get_zobrist(game.width, game.height)
+        self.players = (player, game.get_opponent(player))
+        self.blank = 0
+        for r, c in game.get_blank_spaces():
+            self.blank |= 1 << (r + c * self.height)
+        self.locations = [self.index(game.get_player_location(p)) for p in self.players]
+        self.turn = 0 if game.active_player == player else 1
+        # locations the players moved from, for unmake()
+        self.undo = []
+        zobrist = self.zobrist
+        key = zobrist.own[self.locations[0]] ^ zobrist.opp[self.locations[1]]
+        blocked = ~self.blank
+        for i in range(self.width * self.height):
+            if blocked >> i & 1:
+                key ^= zobrist.blocked[i]
+        if self.turn == 0:
+            key ^= zobrist.own_turn
+        self.key = key
+
+    def __getstate__(self):
+        # players stay behind when a BitBoard is sent to another process: the
+        # receiver sets `players`; move and key tables come from the caches
+        state = self.__dict__.copy()
+        del state["players"], state["moves"], state["zobrist"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.players = (None, None)
+        self.moves = get_knight_moves(self.width, self.height)
+        self.zobrist = get_zobrist(self.width, self.height)
+
+    def index(self, loc):
+        """Cell index of a (row, col) location, `width * height` for None."""
+        if loc is None:
+            return self.width * self.height
+        return loc[0] + loc[1] * self.height
+
+    def moves_mask(self, side):
+        """Mask of the cells player `players[side]` can move to."""
+        return self.moves.masks[self.locations[side]] & self.blank
+
+    def make(self, i):
+        """Move the player to move to cell i."""
+        side = self.turn
+        old = self.locations[side]
+        locs = self.zobrist.opp if side else self.zobrist.own
+        self.key ^= self.zobrist.blocked[i] ^ locs[old] ^ locs[i] ^ self.zobrist.own_turn
+        self.undo.append(old)
+        self.locations[side] = i
+        self.blank ^= 1 << i
+        self.turn = side ^ 1
+        self.move_count += 1
+
+    def unmake(self, i):
+        """Take back the last move, which went to cell i."""
+        side = self.turn ^ 1
+        old = self.undo.pop()
+        locs = self.zobrist.opp if side else self.zobrist.own
+        self.key ^= self.zobrist.blocked[i] ^ locs[old] ^ locs[i] ^ self.zobrist.own_turn
+        self.locations[side] = old
+        self.blank |= 1 << i
+        self.turn = side
+        self.move_count -= 1
+
+    # isolation.Board API
+
+    def side(self, player):
+        if player == self.players[0]:
+            return 0
+        if player == self.players[1]:
+            return 1
+        raise RuntimeError("`player` must be an object registered as a player in the current game.")
+
+    @property
+    def active_player(self):
+        return self.players[self.turn]
+
+    @property
+    def inactive_player(self):
+        return self.players[self.turn ^ 1]
+
+    def get_opponent(self, player):
+        return self.players[self.side(player) ^ 1]
+
+    def get_player_location(self, player):
+        i = self.locations[self.side(player)]
+        if i == self.width * self.height:
+            return None
+        return self.moves.locations[i]
+
+    def get_legal_moves(self, player=None):
+        side = self.turn if player is None else self.side(player)
+        locations = self.moves.locations
+        return [locations[i] for i in bit_indices(self.moves_mask(side))]
+
+    def get_blank_spaces(self):
+        locations = self.moves.locations
+        return [locations[i] for i in bit_indices(self.blank)]
+
+    def move_is_legal(self, move):
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width
+                and self.blank >> self.index(move) & 1 == 1)
+
+    def is_winner(self, player):
+        return player == self.inactive_player and not self.moves_mask(self.turn)
+
+    def is_loser(self, player):
+        return player == self.active_player and not self.moves_mask(self.turn)
+
+    def utility(self, player):
+        if not self.moves_mask(self.turn):
+            if player == self.inactive_player:
+                return float("inf")
+            if player == self.active_player:
+                return float("-inf")
+        return 0.
+
+    def hash(self):
+        return self.key
+
+    def copy(self):
+        # not copy.copy(), which would go through __getstate__ and drop players
+        board = object.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        board.locations = list(self.locations)
+        board.undo = list(self.undo)
+        return board
+
+    def apply_move(self, move):
+        self.make(self.index(move))
+
+    def forecast_move(self, move):
+        board = self.copy()
+        board.apply_move(move)
+        return board
+
+class TranspositionTable:
+    """Search results by position key, in a fixed number of slots.
+
+    A key goes in slot `key % size`, holding (depth, bound, value, move,
+    generation). When two positions want the same slot, the one searched
+    deeper stays, unless it was stored during an earlier move's search
+    (`new_search()` starts a new generation), which always gives way.
+
+    The fields are kept in one flat array each rather than as a tuple per
+    entry: a full table of tuples is hundreds of thousands of objects for the
+    garbage collector to walk, and a collection during a timed search could
+    take longer than the timer threshold.
+    """
+    def __init__(self, size=TABLE_SIZE):
+        self.size = size
+        self.keys = array("Q", [0]) * size
+        # -1 for an empty slot
+        self.depths = array("h", [-1]) * size
+        self.bounds = array("b", [0]) * size
+        self.values = array("d", [0.]) * size
+        # -1 for no move
+        self.moves = array("h", [-1]) * size
+        self.generations = array("I", [0]) * size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        """(depth, bound, value, move, generation) stored for key, or None."""
+        slot = key % self.size
+        if self.keys[slot] != key or self.depths[slot] < 0:
+            return None
+        move = self.moves[slot]
+        return (self.depths[slot], self.bounds[slot], self.values[slot],
+                None if move < 0 else move, self.generations[slot])
+
+    def store(self, key, depth, bound, value, move):
+        slot = key % self.size
+        if (self.depths[slot] < 0 or self.keys[slot] == key
+                or self.generations[slot] != self.generation or depth >= self.depths[slot]):
+            self.keys[slot] = key
+            self.depths[slot] = depth
+            self.bounds[slot] = bound
+            self.values[slot] = value
+            self.moves[slot] = -1 if move is None else move
+            self.generations[slot] = self.generation
+
+# milliseconds of search between two reads of the clock, about
+CHECK_INTERVAL = 1.
+
+# nodes between two reads of the clock, at most, however fast nodes have been
+MAX_CHECK_NODES = 256
+
+class SearchClock:
+    """Tells a search when to stop, reading `time_left()` only every
+    `step` nodes instead of at every node.
+
+    After each read, `step` is sized from the node rate measured since the last
+    one so that it takes about CHECK_INTERVAL ms (growing at most twofold a
+    read, and never past MAX_CHECK_NODES), and a read raises SearchTimeout once
+    less than the timer threshold plus CHECK_INTERVAL is left. So the search
+    still stops with about the threshold left, as when it read the clock at
+    every node. The cap bounds how far a pause the rate did not foresee (a
+    garbage collection, a slow score) can carry the search past a read that
+    would have stopped it. `nodes` counts the nodes searched.
+    """
+    def __init__(self):
+        self.time_left = None
+        self.threshold = 0.
+        self.step = 1
+        self.nodes = 0
+        # node count at which to read the clock next, and at the last read
+        self.next_check = 0
+        self.checked = 0
+        # time left at the last read
+        self.left = 0.
+
+    def start(self, time_left, threshold):
+        """Start a search that ends by time_left; raises SearchTimeout if less
+        than threshold is left already."""
+        self.time_left = time_left
+        self.threshold = threshold
+        self.left = time_left()
+        if self.left < self.threshold:
+            raise SearchTimeout()
+        self.checked = self.nodes
+        self.next_check = self.nodes + self.step
+
+    def check(self):
+        left = self.time_left()
+        if left < self.threshold + CHECK_INTERVAL:
+            raise SearchTimeout()
+        spent = self.left - left
+        if spent > 0:
+            rate_step = int((self.nodes - self.checked) * CHECK_INTERVAL / spent)
+            self.step = max(1, min(2 * self.step, rate_step, MAX_CHECK_NODES))
+        else:
+            self.step = min(2 * self.step, MAX_CHECK_NODES)
+        self.left = left
+        self.checked = self.nodes
+        self.next_check = self.nodes + self.step
+
 class IsolationPlayer:
     """Base class for minimax and alphabeta agents -- this class is never
     constructed or tested directly.
@@ -173,6 +577,10 @@ class MinimaxPlayer(IsolationPlayer):
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.):
+        super().__init__(search_depth, score_fn, timeout)
+        self.clock = SearchClock()
+
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
         result before the time limit expires.
@@ -260,47 +668,60 @@ class MinimaxPlayer(IsolationPlayer):
                 testing.
         """
 
-        def max_value(game, the_depth):
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
+        clock = self.clock
+        clock.start(self.time_left, self.TIMER_THRESHOLD)
 
-            legal_moves = game.get_legal_moves()
+        # moves are made and taken back on one BitBoard instead of copying
+        # the game at every node
+        board = BitBoard(game, self)
+
+        def max_value(the_depth):
+            clock.nodes += 1
+            if clock.nodes >= clock.next_check:
+                clock.check()
+
+            legal_moves = board.moves_mask(board.turn)
             if the_depth == 0  or not legal_moves:
-                score = self.score(game, self)
+                score = self.score(board, self)
                 return score
 
             best_score = float("-inf")
-            for m in legal_moves:
-                next_game = game.forecast_move(m)
-                score = min_value(next_game, the_depth - 1)
+            for m in bit_indices(legal_moves):
+                board.make(m)
+                score = min_value(the_depth - 1)
+                board.unmake(m)
                 if score > best_score:
                     best_score = score
             return best_score
 
-        def min_value(game, the_depth):
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
+        def min_value(the_depth):
+            clock.nodes += 1
+            if clock.nodes >= clock.next_check:
+                clock.check()
 
-            legal_moves = game.get_legal_moves()
+            legal_moves = board.moves_mask(board.turn)
             if the_depth == 0 or not legal_moves:
-                score = self.score(game, self)
+                score = self.score(board, self)
                 return score
 
             best_score = float("inf")
-            for m in legal_moves:
-                next_game = game.forecast_move(m)
-                score = max_value(next_game, the_depth - 1)
+            for m in bit_indices(legal_moves):
+                board.make(m)
+                score = max_value(the_depth - 1)
+                board.unmake(m)
                 if score < best_score:
                     best_score = score
             return best_score
 
         best_score = float("-inf")
         best_move = (-1, -1)
-        for move in game.get_legal_moves():
-            score = min_value(game.forecast_move(move), depth - 1)
+        for move in bit_indices(board.moves_mask(board.turn)):
+            board.make(move)
+            score = min_value(depth - 1)
+            board.unmake(move)
             if score > best_score:
                 best_score = score
-                best_move = move
+                best_move = board.moves.locations[move]
         return best_move
 
 
@@ -308,7 +729,107 @@ class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
+
+    Search results are kept in a transposition table of table_size entries,
+    kept across moves, so positions reached again through another move order,
+    at the next depth or on the next turn are not searched from scratch.
+
+    Moves are searched best first, as far as earlier iterations can tell: the
+    best move stored for the position (along the principal variation, the one
+    the last iteration chose), then the killer moves of the ply (moves that
+    caused a cutoff at the same distance from the root), then by history
+    score (how often and how deep a move of that side caused a cutoff).
+
+    With workers > 1 the root moves are dealt out to that many worker
+    processes (at most one per root move), each deepening on its own share
+    with its own table until the turn's deadline; the move returned is the best
+    of the deepest iteration every worker completed. The pool starts with the
+    player (see start()) and lasts until close(), the end of a `with` block
+    using the player, or the player itself; score_fn must be picklable. If a
+    worker dies or a task cannot be pickled, a RuntimeWarning is issued, the
+    pool is closed and the player searches on its own for the rest of the turn
+    and from then on. `worker_stats` holds (nodes, seconds, nodes per second)
+    for each worker that reported on the last move.
     """
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 table_size=TABLE_SIZE, workers=1):
+        super().__init__(search_depth, score_fn, timeout)
+        self.table = TranspositionTable(table_size)
+        # ply -> up to KILLERS moves, most recent first
+        self.killers = {}
+        # per side (0 for the opponent, 1 for this player): move -> score
+        self.history = ({}, {})
+        self.clock = SearchClock()
+        self.workers = workers
+        self.pool = None
+        # shuts the pool down if the player goes away without close()
+        self.pool_finalizer = None
+        self.worker_stats = []
+        if workers > 1:
+            self.start()
+
+    def start(self):
+        """Start the worker processes of a parallel search, and wait until
+        they are all running, so that no timed move pays for it."""
+        if self.pool is None:
+            # no worker gets past its initializer before they all have started
+            ready = multiprocessing.Barrier(self.workers)
+            self.pool = ProcessPoolExecutor(
+                self.workers, initializer=init_worker,
+                initargs=(self.search_depth, self.score, self.TIMER_THRESHOLD, self.table.size, ready))
+            self.pool_finalizer = weakref.finalize(self, self.pool.shutdown, wait=False, cancel_futures=True)
+            # a worker is started for each task submitted while none is idle
+            for future in [self.pool.submit(int) for _ in range(self.workers)]:
+                future.result()
+
+    def close(self, block=True):
+        """Stop the worker processes of a parallel search, if any; with block,
+        return once they have exited."""
+        if self.pool is not None:
+            self.pool_finalizer.detach()
+            self.pool.shutdown(wait=block, cancel_futures=True)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start_search(self, time_left):
+        """Get ready to search a new turn, which ends by time_left."""
+        self.time_left = time_left
+        self.table.new_search()
+        # plies now count from a new root; history carries over, fading
+        self.killers = {}
+        for history in self.history:
+            for m in history:
+                history[m] //= 2
+        # nodes searched this turn
+        self.clock.nodes = 0
+
+    def order_moves(self, moves, first, ply, own):
+        """Sort moves in place, best first: first (the stored best move, or
+        None), then the killers of ply, then by history score. own tells whose
+        moves they are."""
+        history = self.history[own]
+        moves.sort(key=lambda m: history.get(m, 0), reverse=True)
+        for m in reversed(self.killers.get(ply, ())):
+            if m in moves:
+                moves.remove(m)
+                moves.insert(0, m)
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+
+    def record_cutoff(self, move, ply, own, depth):
+        """Remember a move that cut the search off with depth plies to go."""
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS:]
+        history = self.history[own]
+        history[move] = history.get(move, 0) + depth * depth
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -340,21 +861,28 @@ class AlphaBetaPlayer(IsolationPlayer):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
-        self.time_left = time_left
+        self.start_search(time_left)
         best_move = (-1, -1)
-        alpha = float("inf")
-        beta = float("-inf")
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
             legal_moves = game.get_legal_moves()
             if legal_moves:
-                #next_move =  self.alphabeta(game, self.search_depth, alpha, beta)
+                # a legal move, even if the first iteration runs out of time
+                best_move = legal_moves[0]
+                # the game cannot last more plies than there are blank cells
+                max_depth = len(game.get_blank_spaces())
+                if self.pool is not None and len(legal_moves) > 1:
+                    next_move = self.parallel_move(game, legal_moves, max_depth)
+                    if next_move is not None:
+                        return next_move
+                    # the workers failed: search here in the time left
                 for i in range(ADD_DEPTH):
-                    next_move =  self.alphabeta(game, self.search_depth+i, alpha, beta)
+                    if self.search_depth + i > max_depth:
+                        break
+                    next_move =  self.alphabeta(game, self.search_depth+i)
                     if next_move != (-1, -1):
                         best_move = next_move
-                # return next_move
 
         except SearchTimeout:
             pass  # Handle any actions required after timeout as needed
@@ -362,6 +890,48 @@ class AlphaBetaPlayer(IsolationPlayer):
         # Return the best move from the last completed search iteration
         return best_move
 
+    def parallel_move(self, game, legal_moves, max_depth):
+        """Search legal_moves, the root moves of game, in the worker
+        processes until the turn's deadline, and return the best move of the
+        deepest iteration they all completed. Returns None if the workers
+        failed, after closing the pool."""
+        board = BitBoard(game, self)
+        # workers stop a threshold early, leaving time to collect their results
+        deadline = time.monotonic() + (self.time_left() - 2 * self.TIMER_THRESHOLD) / 1000.
+        shares = [legal_moves[i::self.workers] for i in range(min(self.workers, len(legal_moves)))]
+        # per worker: (score, move) of each iteration completed, shallowest first
+        results = []
+        self.worker_stats = []
+        try:
+            futures = [self.pool.submit(search_root_moves, board, share, deadline, max_depth)
+                       for share in shares]
+            done, late = wait(futures, max(0., (self.time_left() - self.TIMER_THRESHOLD) / 1000.))
+            # so they do not hold up the next move's tasks
+            for future in late:
+                future.cancel()
+            for future in futures:
+                if future in done:
+                    iterations, nodes, seconds = future.result()
+                    results.append(iterations)
+                    self.worker_stats.append((nodes, seconds, nodes / seconds if seconds > 0 else 0.))
+        except (BrokenProcessPool, pickle.PicklingError) as e:
+            warnings.warn("parallel search failed, searching in this process from now on: %s" % e,
+                          RuntimeWarning)
+            self.close(block=False)
+            return None
+        if len(results) == len(shares) and all(results):
+            depth = min(len(iterations) for iterations in results)
+            candidates = [iterations[depth - 1] for iterations in results]
+        else:
+            # a worker did not report or completed no iteration: its moves
+            # are unsearched, so make do with the best the others found
+            candidates = [iterations[-1] for iterations in results if iterations]
+        # a share where every move loses has no best move
+        candidates = [result for result in candidates if result[1] != (-1, -1)]
+        if not candidates:
+            return legal_moves[0]
+        return max(candidates, key=lambda result: result[0])[1]
+
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
         """Implement depth-limited minimax search with alpha-beta pruning as
         described in the lectures.
@@ -407,52 +977,164 @@ class AlphaBetaPlayer(IsolationPlayer):
                 each helper function or else your agent will timeout during
                 testing.
         """
-
-        def max_value(game, alpha,  beta, the_depth ):
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
-
-            legal_moves = game.get_legal_moves()
+        return self.search(game, depth, alpha, beta)[1]
+
+    def search(self, game, depth, alpha=float("-inf"), beta=float("inf"), root_moves=None):
+        """alphabeta(), returning the score of the best move too, as (score,
+        move). With root_moves, a list of legal moves, the root searches only
+        those, and its result is not stored in the table."""
+        clock = self.clock
+        clock.start(self.time_left, self.TIMER_THRESHOLD)
+
+        # moves are made and taken back on one BitBoard instead of copying
+        # the game at every node; moves are cell indices until returned
+        board = BitBoard(game, self)
+        table = self.table
+
+        def probe(key, alpha, beta, the_depth):
+            """Look key up: returns (value, None) if the entry settles the
+            node, otherwise (None, the best move stored for it or None)."""
+            entry = table.probe(key)
+            if entry is None:
+                return None, None
+            stored_depth, bound, value, move, _ = entry
+            if stored_depth >= the_depth:
+                if (bound == EXACT or (bound == LOWER and value >= beta)
+                        or (bound == UPPER and value <= alpha)):
+                    return value, None
+            return None, move
+
+        def store(key, the_depth, alpha, beta, best_score, best_move):
+            if best_score >= beta:
+                bound = LOWER
+            elif best_score <= alpha:
+                bound = UPPER
+            else:
+                bound = EXACT
+            table.store(key, the_depth, bound, best_score, best_move)
+
+        def max_value(alpha,  beta, the_depth):
+            clock.nodes += 1
+            if clock.nodes >= clock.next_check:
+                clock.check()
+
+            legal_moves = board.moves_mask(board.turn)
             if the_depth == 0 or not legal_moves:
-                return  self.score(game, self)
-
+                return  self.score(board, self)
+            key = board.key
+            value, first = probe(key, alpha, beta, the_depth)
+            if value is not None:
+                return value
+            ply = depth - the_depth
+            legal_moves = bit_indices(legal_moves)
+            self.order_moves(legal_moves, first, ply, 1)
+
+            alpha_in = alpha
             best_score = float("-inf")
+            best_move = None
             for m in legal_moves:
-                next_game = game.forecast_move(m)
-                score = min_value(next_game, alpha, beta, the_depth - 1)
+                board.make(m)
+                score = min_value(alpha, beta, the_depth - 1)
+                board.unmake(m)
                 if score > best_score:
-                    if score >= beta:
-                        return score
                     best_score = score
+                    best_move = m
+                    if score >= beta:
+                        self.record_cutoff(m, ply, 1, the_depth)
+                        break
                     alpha = max (alpha, score)
+            store(key, the_depth, alpha_in, beta, best_score, best_move)
             return best_score
 
-        def min_value(game, alpha, beta, the_depth):
-            if self.time_left() < self.TIMER_THRESHOLD:
-                raise SearchTimeout()
+        def min_value(alpha, beta, the_depth):
+            clock.nodes += 1
+            if clock.nodes >= clock.next_check:
+                clock.check()
 
-            legal_moves = game.get_legal_moves()
+            legal_moves = board.moves_mask(board.turn)
             if the_depth == 0 or not legal_moves:
-                return self.score(game, self)
-
+                return self.score(board, self)
+            key = board.key
+            value, first = probe(key, alpha, beta, the_depth)
+            if value is not None:
+                return value
+            ply = depth - the_depth
+            legal_moves = bit_indices(legal_moves)
+            self.order_moves(legal_moves, first, ply, 0)
+
+            beta_in = beta
             best_score = float("inf")
+            best_move = None
             for m in legal_moves:
-                next_game = game.forecast_move(m)
-                score = max_value(next_game, alpha, beta, the_depth - 1)
+                board.make(m)
+                score = max_value(alpha, beta, the_depth - 1)
+                board.unmake(m)
                 if score < best_score:
-                    if score <= alpha:
-                        return score
                     best_score = score
+                    best_move = m
+                    if score <= alpha:
+                        self.record_cutoff(m, ply, 0, the_depth)
+                        break
                     beta = min(beta, score)
+            store(key, the_depth, alpha, beta_in, best_score, best_move)
             return best_score
 
+        key = board.key
+        legal_moves = bit_indices(board.moves_mask(board.turn))
+        entry = table.probe(key)
+        if root_moves is not None:
+            legal_moves = [m for m in legal_moves if board.moves.locations[m] in root_moves]
+        elif entry is not None and entry[0] >= depth and entry[1] == EXACT and entry[3] in legal_moves:
+            return entry[2], board.moves.locations[entry[3]]
+        # the previous iteration's choice first
+        self.order_moves(legal_moves, entry and entry[3], 0, 1)
+
+        alpha_in = alpha
         best_score = float("-inf")
-        best_move = (-1, -1)
-        for move in game.get_legal_moves():
-            next_game = game.forecast_move(move)
-            score = min_value(next_game, alpha, beta, depth - 1)
+        best_move = None
+        for move in legal_moves:
+            board.make(move)
+            score = min_value(alpha, beta, depth - 1)
+            board.unmake(move)
             if score > best_score:
                 best_score = score
                 best_move = move
                 alpha = max (alpha, score)
-        return best_move
+        if best_move is None:
+            return best_score, (-1, -1)
+        if root_moves is None:
+            store(key, depth, alpha_in, beta, best_score, best_move)
+        return best_score, board.moves.locations[best_move]
+
+# the AlphaBetaPlayer of a worker process of a parallel search
+worker_player = None
+
+def init_worker(search_depth, score_fn, timeout, table_size, ready):
+    global worker_player
+    worker_player = AlphaBetaPlayer(search_depth, score_fn, timeout, table_size)
+    ready.wait()
+
+def search_root_moves(board, root_moves, deadline, max_depth):
+    """Deepen on root_moves of board, a BitBoard of the parallel searching
+    player, in a worker process, until deadline (a `time.monotonic()` time) or
+    max_depth.
+
+    Returns
+    -------
+    (list, int, float)
+        The (score, move) of each iteration completed, from search_depth on;
+        the nodes searched; the seconds taken.
+    """
+    player = worker_player
+    # the worker plays the searching player's side; any other object does for
+    # the opponent
+    board.players = (player, object())
+    start = time.monotonic()
+    player.start_search(lambda: (deadline - time.monotonic()) * 1000)
+    iterations = []
+    try:
+        for depth in range(player.search_depth, max_depth + 1):
+            iterations.append(player.search(board, depth, root_moves=root_moves))
+    except SearchTimeout:
+        pass
+    return iterations, player.clock.nodes, time.monotonic() - start